@@ -1,20 +1,32 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, colorchooser
 import os
-import zipfile
-import tempfile
 import shutil
 from PIL import Image, ImageTk
 import threading
-from typing import List, Tuple, Optional
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from image_resizer import ImageResizer, ImageCache
 
 class ModernImageResizerApp:
+    # Output format choice that keeps each source file's own format
+    KEEP_FORMAT = "Keep original"
+    # Largest side of the preview images, in pixels
+    PREVIEW_SIZE = 300
+    # Previews are rendered from sources decoded at reduced resolution, at least this many
+    # times PREVIEW_SIZE (only JPEGs can be decoded that way, other formats decode in full)
+    PREVIEW_DECODE_GAP = 2
+    # Quiet time after the last option change before the result preview re-renders
+    PREVIEW_DELAY_MS = 250
+    
     def __init__(self, root):
         self.root = root
         self.setup_window()
         self.setup_styles()
         self.create_widgets()
         self.resizer = ImageResizer()
+        # Decoded sources and previews, so re-selecting or resizing an image skips the decode
+        self.image_cache = ImageCache()
         
     def setup_window(self):
         self.root.title("🖼️ Image Resizer Pro")
@@ -76,11 +88,16 @@ class ModernImageResizerApp:
         self.create_zip_tab()
         
         # Status bar
+        status_frame = ttk.Frame(main_frame, relief=tk.SUNKEN)
+        status_frame.pack(fill=tk.X, side=tk.BOTTOM)
+        
         self.status_var = tk.StringVar()
         self.status_var.set("Ready")
-        status_bar = ttk.Label(main_frame, textvariable=self.status_var, 
-                              relief=tk.SUNKEN, anchor=tk.W, padding=(10, 5))
-        status_bar.pack(fill=tk.X, side=tk.BOTTOM)
+        status_bar = ttk.Label(status_frame, textvariable=self.status_var, anchor=tk.W, padding=(10, 5))
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        self.cache_status_var = tk.StringVar()
+        ttk.Label(status_frame, textvariable=self.cache_status_var, anchor=tk.E, padding=(10, 5)).pack(side=tk.RIGHT)
     
     def create_single_image_tab(self):
         # Single Image Tab
@@ -160,6 +177,23 @@ class ModernImageResizerApp:
         
         self.preview_label = ttk.Label(self.preview_frame, text="No image selected", anchor=tk.CENTER)
         self.preview_label.pack(expand=True)
+        
+        # Result preview, re-rendered as the options change
+        ttk.Label(right_frame, text="Result:", font=('Segoe UI', 11, 'bold')).pack(anchor=tk.W, pady=(10, 5))
+        
+        self.result_preview_frame = ttk.Frame(right_frame, relief=tk.SUNKEN, borderwidth=2)
+        self.result_preview_frame.pack(fill=tk.BOTH, expand=True)
+        
+        self.result_preview_label = ttk.Label(self.result_preview_frame, text="No image selected", anchor=tk.CENTER)
+        self.result_preview_label.pack(expand=True)
+        
+        self.preview_job = None
+        self.preview_generation = 0
+        # Renders run one at a time, so quick edits can't decode the same image side by side
+        self.preview_executor = ThreadPoolExecutor(max_workers=1)
+        for var in (self.single_image_var, self.single_width_var, self.single_height_var,
+                    self.single_maintain_aspect, self.png_bg_option, self.custom_color):
+            var.trace_add('write', self.schedule_preview)
     
     def create_folder_tab(self):
         # Folder Processing Tab
@@ -188,12 +222,24 @@ class ModernImageResizerApp:
         
         ttk.Label(folder_dim_frame, text="Height:").pack(side=tk.LEFT)
         self.folder_height_var = tk.StringVar(value="600")
-        ttk.Spinbox(folder_dim_frame, from_=1, to=10000, textvariable=self.folder_height_var, width=10).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Spinbox(folder_dim_frame, from_=1, to=10000, textvariable=self.folder_height_var, width=10).pack(side=tk.LEFT, padx=(5, 15))
+        
+        ttk.Label(folder_dim_frame, text="Workers:").pack(side=tk.LEFT)
+        self.folder_workers_var = tk.StringVar(value=str(os.cpu_count() or 1))
+        ttk.Spinbox(folder_dim_frame, from_=1, to=256, textvariable=self.folder_workers_var, width=5).pack(side=tk.LEFT, padx=(5, 15))
+        
+        ttk.Label(folder_dim_frame, text="Output format:").pack(side=tk.LEFT)
+        self.folder_format_var = tk.StringVar(value=self.KEEP_FORMAT)
+        ttk.Combobox(folder_dim_frame, textvariable=self.folder_format_var, state='readonly', width=14,
+                     values=[self.KEEP_FORMAT] + [name.upper() for name in ImageResizer.target_formats]).pack(side=tk.LEFT, padx=(5, 0))
         
         # Options
         self.folder_maintain_aspect = tk.BooleanVar(value=True)
         ttk.Checkbutton(folder_frame, text="Maintain aspect ratio", variable=self.folder_maintain_aspect).pack(anchor=tk.W, pady=(0, 10))
         
+        self.folder_incremental = tk.BooleanVar(value=False)
+        ttk.Checkbutton(folder_frame, text="Only process new or changed images", variable=self.folder_incremental).pack(anchor=tk.W, pady=(0, 10))
+        
         # PNG Background Color Selection for Folder
         folder_png_bg_frame = ttk.LabelFrame(folder_frame, text="PNG Background Color", padding="10")
         folder_png_bg_frame.pack(fill=tk.X, pady=(0, 15))
@@ -213,12 +259,18 @@ class ModernImageResizerApp:
         ttk.Entry(folder_custom_color_frame, textvariable=self.folder_custom_color, width=10).pack(side=tk.LEFT, padx=(5, 5))
         ttk.Button(folder_custom_color_frame, text="Choose", command=self.choose_folder_custom_color).pack(side=tk.LEFT)
         
-        # Process button
-        ttk.Button(folder_frame, text="🔄 Process Folder", command=self.process_folder, style='Modern.TButton').pack(pady=10)
+        # Process and cancel buttons
+        folder_button_frame = ttk.Frame(folder_frame)
+        folder_button_frame.pack(pady=10)
+        ttk.Button(folder_button_frame, text="🔄 Process Folder", command=self.process_folder, style='Modern.TButton').pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(folder_button_frame, text="⏹ Cancel", command=self.cancel_folder, style='Modern.TButton').pack(side=tk.LEFT)
+        self.folder_cancel_event = None
         
-        # Progress bar
-        self.folder_progress = ttk.Progressbar(folder_frame, mode='indeterminate')
+        # Progress bar with throughput and ETA
+        self.folder_progress = ttk.Progressbar(folder_frame, mode='determinate')
         self.folder_progress.pack(fill=tk.X, pady=(10, 0))
+        self.folder_progress_var = tk.StringVar()
+        ttk.Label(folder_frame, textvariable=self.folder_progress_var).pack(anchor=tk.W, pady=(5, 0))
         
         # Status
         self.folder_status_var = tk.StringVar()
@@ -252,7 +304,16 @@ class ModernImageResizerApp:
         
         ttk.Label(zip_dim_frame, text="Height:").pack(side=tk.LEFT)
         self.zip_height_var = tk.StringVar(value="600")
-        ttk.Spinbox(zip_dim_frame, from_=1, to=10000, textvariable=self.zip_height_var, width=10).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Spinbox(zip_dim_frame, from_=1, to=10000, textvariable=self.zip_height_var, width=10).pack(side=tk.LEFT, padx=(5, 15))
+        
+        ttk.Label(zip_dim_frame, text="Workers:").pack(side=tk.LEFT)
+        self.zip_workers_var = tk.StringVar(value=str(os.cpu_count() or 1))
+        ttk.Spinbox(zip_dim_frame, from_=1, to=256, textvariable=self.zip_workers_var, width=5).pack(side=tk.LEFT, padx=(5, 15))
+        
+        ttk.Label(zip_dim_frame, text="Output format:").pack(side=tk.LEFT)
+        self.zip_format_var = tk.StringVar(value=self.KEEP_FORMAT)
+        ttk.Combobox(zip_dim_frame, textvariable=self.zip_format_var, state='readonly', width=14,
+                     values=[self.KEEP_FORMAT] + [name.upper() for name in ImageResizer.target_formats]).pack(side=tk.LEFT, padx=(5, 0))
         
         # Options
         self.zip_maintain_aspect = tk.BooleanVar(value=True)
@@ -277,12 +338,18 @@ class ModernImageResizerApp:
         ttk.Entry(zip_custom_color_frame, textvariable=self.zip_custom_color, width=10).pack(side=tk.LEFT, padx=(5, 5))
         ttk.Button(zip_custom_color_frame, text="Choose", command=self.choose_zip_custom_color).pack(side=tk.LEFT)
         
-        # Process button
-        ttk.Button(zip_frame, text="🔄 Process Zip File", command=self.process_zip_file, style='Modern.TButton').pack(pady=10)
+        # Process and cancel buttons
+        zip_button_frame = ttk.Frame(zip_frame)
+        zip_button_frame.pack(pady=10)
+        ttk.Button(zip_button_frame, text="🔄 Process Zip File", command=self.process_zip_file, style='Modern.TButton').pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(zip_button_frame, text="⏹ Cancel", command=self.cancel_zip, style='Modern.TButton').pack(side=tk.LEFT)
+        self.zip_cancel_event = None
         
-        # Progress bar
-        self.zip_progress = ttk.Progressbar(zip_frame, mode='indeterminate')
+        # Progress bar with throughput and ETA
+        self.zip_progress = ttk.Progressbar(zip_frame, mode='determinate')
         self.zip_progress.pack(fill=tk.X, pady=(10, 0))
+        self.zip_progress_var = tk.StringVar()
+        ttk.Label(zip_frame, textvariable=self.zip_progress_var).pack(anchor=tk.W, pady=(5, 0))
         
         # Status
         self.zip_status_var = tk.StringVar()
@@ -298,8 +365,8 @@ class ModernImageResizerApp:
             ]
         )
         if file_path:
+            # Setting the path schedules the previews
             self.single_image_var.set(file_path)
-            self.load_image_preview(file_path)
     
     def browse_folder(self):
         folder_path = filedialog.askdirectory(title="Select Folder Containing Images")
@@ -337,59 +404,209 @@ class ModernImageResizerApp:
         hex_color = hex_color.lstrip('#')
         return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
     
+    def get_target_format(self, format_var):
+        """Convert an output format choice into an ImageResizer target_format"""
+        value = format_var.get()
+        return None if value == self.KEEP_FORMAT else value.lower()
+    
+    def load_preview_source(self, image_path):
+        """Return image_path decoded at reduced resolution for previews, through the cache (safe off the UI thread)"""
+        def load():
+            image = Image.open(image_path)
+            decode_size = self.PREVIEW_SIZE * self.PREVIEW_DECODE_GAP
+            image.draft(None, (decode_size, decode_size))
+            image.load()
+            return image
+        return self.image_cache.get_or_load(self.image_cache.file_key(image_path, 'preview-source'), load)
+    
     def load_image_preview(self, image_path):
+        """Return the preview of the original image, decoding through the cache on a miss (safe off the UI thread)"""
+        def load():
+            source = self.load_preview_source(image_path)
+            # Resize for preview (max 300x300), leaving the cached source untouched
+            return self.scale_preview(source, min(self.PREVIEW_SIZE / source.width, self.PREVIEW_SIZE / source.height, 1))
+        return self.image_cache.get_or_load(self.image_cache.file_key(image_path, 'preview'), load)
+    
+    def scale_preview(self, image, scale):
+        """Scale an image down for previewing without modifying it"""
+        size = (max(round(image.width * scale), 1), max(round(image.height * scale), 1))
+        return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    
+    def schedule_preview(self, *args):
+        """Re-render the previews once the single image options have stopped changing"""
+        if self.preview_job is not None:
+            self.root.after_cancel(self.preview_job)
+        self.preview_job = self.root.after(self.PREVIEW_DELAY_MS, self.start_preview)
+    
+    def start_preview(self):
+        """Read the single image options on the UI thread and render the previews on a worker thread"""
+        self.preview_job = None
+        image_path = self.single_image_var.get()
+        if not image_path:
+            return
         try:
-            # Load and resize image for preview
-            image = Image.open(image_path)
-            # Resize for preview (max 300x300)
-            image.thumbnail((300, 300), Image.Resampling.LANCZOS)
-            
-            # Convert to PhotoImage
-            photo = ImageTk.PhotoImage(image)
+            width = int(self.single_width_var.get())
+            height = int(self.single_height_var.get())
+            custom_color = None
+            if self.png_bg_option.get() == "custom":
+                custom_color = self.hex_to_rgb(self.custom_color.get())
+        except ValueError:
+            # Half-typed dimensions or color; the next edit schedules another render
+            return
+        if width < 1 or height < 1:
+            return
+        
+        self.preview_generation += 1
+        args = (self.preview_generation, image_path, width, height, self.single_maintain_aspect.get(), self.png_bg_option.get(), custom_color)
+        self.preview_executor.submit(self.render_previews, *args)
+    
+    def render_previews(self, generation, image_path, width, height, maintain_aspect, png_bg_option, custom_color):
+        """Build the original and result previews off the UI thread and hand them to show_previews"""
+        if generation != self.preview_generation:
+            # Superseded before it started
+            return
+        try:
+            original = self.load_image_preview(image_path)
             
-            # Update preview
+            # Render the canvas at preview size from a source shrunk by the same factor,
+            # so the cost doesn't grow with the resolution of the original
+            source = self.load_preview_source(image_path)
+            with Image.open(image_path) as header:
+                full_width = header.width
+            scale = min(self.PREVIEW_SIZE / width, self.PREVIEW_SIZE / height, 1)
+            # The reduced decode may already be smaller than that, it is then used as it is
+            source_scale = min(scale * full_width / source.width, 1)
+            result = self.resizer.resize_image(
+                self.scale_preview(source, source_scale), max(round(width * scale), 1), max(round(height * scale), 1),
+                maintain_aspect, png_bg_option, custom_color, image_path.lower().endswith('.png')
+            )
+        except Exception as e:
+            self.root.after(0, self.show_previews, generation, None, None, str(e))
+            return
+        self.root.after(0, self.show_previews, generation, original, result, None)
+    
+    def show_previews(self, generation, original, result, error):
+        """Display rendered previews unless a newer render has been started since"""
+        if generation != self.preview_generation:
+            return
+        
+        if error:
+            self.preview_label.configure(image="", text=f"Error loading preview:\n{error}")
+            self.preview_label.image = None
+            self.result_preview_label.configure(image="", text="")
+            self.result_preview_label.image = None
+        else:
+            # Convert to PhotoImage, which must happen on the UI thread
+            photo = ImageTk.PhotoImage(original)
             self.preview_label.configure(image=photo, text="")
             self.preview_label.image = photo  # Keep a reference
             
-        except Exception as e:
-            self.preview_label.configure(image="", text=f"Error loading preview:\n{str(e)}")
+            result_photo = ImageTk.PhotoImage(result)
+            self.result_preview_label.configure(image=result_photo, text="")
+            self.result_preview_label.image = result_photo
+        
+        self.update_cache_status()
+    
+    def update_cache_status(self):
+        """Show image cache hit/miss counts and memory use in the status bar"""
+        stats = self.image_cache.stats()
+        self.cache_status_var.set(f"Cache: {stats['hits']} hits · {stats['misses']} misses · "
+                                  f"{stats['bytes'] / (1024 * 1024):.0f}/{stats['max_bytes'] / (1024 * 1024):.0f} MB")
+    
+    def cancel_folder(self):
+        """Stop the running folder batch after the files already in progress"""
+        if self.folder_cancel_event:
+            self.folder_cancel_event.set()
+            self.status_var.set("Cancelling...")
+    
+    def cancel_zip(self):
+        """Stop the running zip batch after the files already in progress"""
+        if self.zip_cancel_event:
+            self.zip_cancel_event.set()
+            self.status_var.set("Cancelling...")
+    
+    def make_progress_callback(self, progress_bar, progress_var):
+        """Build a batch progress callback that updates the given widgets on the UI thread"""
+        def update(event):
+            # The total is None while a folder is still being listed
+            progress_bar.configure(maximum=max(event['total'] or event['completed'] + 1, 1), value=event['completed'])
+            progress_var.set(self.format_progress(event))
+        
+        def callback(event):
+            # Called from the batch thread; Tk widgets must only be touched from the UI thread
+            self.root.after(0, update, event)
+        
+        return callback
+    
+    def format_progress(self, event):
+        """Format a progress event as 'done/total images · rate · ETA'"""
+        total = event['total'] if event['total'] is not None else "?"
+        text = f"{event['completed']}/{total} images · {event['images_per_second']:.1f} images/sec"
+        if event['eta_seconds'] is not None:
+            minutes, seconds = divmod(int(event['eta_seconds']), 60)
+            text += f" · ETA {minutes}:{seconds:02d}"
+        return text
     
     def process_single_image(self):
         if not self.single_image_var.get():
             messagebox.showerror("Error", "Please select an image file first")
             return
         
+        # Tk variables and dialogs are only touched here, on the UI thread
+        try:
+            image_path = self.single_image_var.get()
+            width = int(self.single_width_var.get())
+            height = int(self.single_height_var.get())
+            maintain_aspect = self.single_maintain_aspect.get()
+            
+            # Get PNG background color option
+            png_bg_option = self.png_bg_option.get()
+            custom_color = None
+            if png_bg_option == "custom":
+                custom_color = self.hex_to_rgb(self.custom_color.get())
+        except ValueError as e:
+            self.single_status_var.set(f"❌ Error: {str(e)}")
+            messagebox.showerror("Error", f"Failed to process image: {str(e)}")
+            return
+        
+        # Ask user where to save the resized image
+        name, ext = os.path.splitext(image_path)
+        output_path = filedialog.asksaveasfilename(
+            title="Save Resized Image",
+            defaultextension=ext,
+            initialfile=f"{os.path.basename(name)}{ext}",
+            filetypes=[
+                ("Image files", "*.jpg *.jpeg *.png *.bmp *.tiff *.webp"),
+                ("All files", "*.*")
+            ]
+        )
+        if not output_path:
+            return
+        
+        self.status_var.set("Processing single image...")
+        
         def process():
+            # Worker thread: results go back to the UI thread through root.after
             try:
-                self.status_var.set("Processing single image...")
-                self.root.update()
-                
-                width = int(self.single_width_var.get())
-                height = int(self.single_height_var.get())
-                maintain_aspect = self.single_maintain_aspect.get()
-                
-                # Get PNG background color option
-                png_bg_option = self.png_bg_option.get()
-                custom_color = None
-                if png_bg_option == "custom":
-                    custom_color = self.hex_to_rgb(self.custom_color.get())
-                
                 result = self.resizer.process_single_image_file(
-                    self.single_image_var.get(), width, height, maintain_aspect, png_bg_option, custom_color
+                    image_path, width, height, maintain_aspect, png_bg_option, custom_color,
+                    cache=self.image_cache, output_path=output_path
                 )
-                
-                if result:
-                    self.single_status_var.set(f"✅ Success")
-                    messagebox.showinfo("Success", f"Image processed successfully!\n\n{result}")
-                else:
-                    self.single_status_var.set("❌ Failed to process image")
-                
-                self.status_var.set("Ready")
-                
             except Exception as e:
-                self.single_status_var.set(f"❌ Error: {str(e)}")
-                messagebox.showerror("Error", f"Failed to process image: {str(e)}")
-                self.status_var.set("Ready")
+                self.root.after(0, failed, e)
+                return
+            self.root.after(0, finished, result)
+        
+        def finished(result):
+            self.single_status_var.set(f"✅ Success")
+            self.status_var.set("Ready")
+            self.update_cache_status()
+            messagebox.showinfo("Success", f"Image processed successfully!\n\n{result}")
+        
+        def failed(e):
+            self.single_status_var.set(f"❌ Error: {str(e)}")
+            self.status_var.set("Ready")
+            messagebox.showerror("Error", f"Failed to process image: {str(e)}")
         
         threading.Thread(target=process, daemon=True).start()
     
@@ -398,42 +615,64 @@ class ModernImageResizerApp:
             messagebox.showerror("Error", "Please select a folder first")
             return
         
+        # Tk variables are only touched here and in the callbacks below, on the UI thread
+        try:
+            folder_path = self.folder_path_var.get()
+            width = int(self.folder_width_var.get())
+            height = int(self.folder_height_var.get())
+            workers = int(self.folder_workers_var.get())
+            maintain_aspect = self.folder_maintain_aspect.get()
+            incremental = self.folder_incremental.get()
+            target_format = self.get_target_format(self.folder_format_var)
+            
+            # Get PNG background color option
+            png_bg_option = self.folder_png_bg_option.get()
+            custom_color = None
+            if png_bg_option == "custom":
+                custom_color = self.hex_to_rgb(self.folder_custom_color.get())
+        except ValueError as e:
+            self.folder_status_var.set(f"❌ Error: {str(e)}")
+            messagebox.showerror("Error", f"Failed to process folder: {str(e)}")
+            return
+        
+        self.status_var.set("Processing folder...")
+        self.folder_progress.configure(value=0)
+        self.folder_progress_var.set("")
+        self.folder_cancel_event = threading.Event()
+        progress_callback = self.make_progress_callback(self.folder_progress, self.folder_progress_var)
+        
         def process():
+            # Worker thread: results go back to the UI thread through root.after
             try:
-                self.status_var.set("Processing folder...")
-                self.folder_progress.start()
-                self.root.update()
-                
-                width = int(self.folder_width_var.get())
-                height = int(self.folder_height_var.get())
-                maintain_aspect = self.folder_maintain_aspect.get()
-                
-                # Get PNG background color option
-                png_bg_option = self.folder_png_bg_option.get()
-                custom_color = None
-                if png_bg_option == "custom":
-                    custom_color = self.hex_to_rgb(self.folder_custom_color.get())
-                
-                processed_files, status = self.resizer.process_folder(
-                    self.folder_path_var.get(), width, height, maintain_aspect, png_bg_option, custom_color
+                result = self.resizer.batch_folder(
+                    folder_path, width, height, maintain_aspect, png_bg_option, custom_color,
+                    workers=workers, incremental=incremental, target_format=target_format,
+                    progress_callback=progress_callback, cancel_event=self.folder_cancel_event
                 )
-                
-                self.folder_progress.stop()
-                
-                if processed_files:
-                    self.folder_status_var.set(f"✅ Success - {len(processed_files)} images processed")
-                    messagebox.showinfo("Success", f"Folder processed successfully!\n\n{status}")
-                else:
-                    self.folder_status_var.set(f"❌ Failed")
-                    messagebox.showerror("Error", status)
-                
-                self.status_var.set("Ready")
-                
             except Exception as e:
-                self.folder_progress.stop()
-                self.folder_status_var.set(f"❌ Error: {str(e)}")
-                messagebox.showerror("Error", f"Failed to process folder: {str(e)}")
-                self.status_var.set("Ready")
+                self.root.after(0, failed, e)
+                return
+            self.root.after(0, finished, result)
+        
+        def finished(result):
+            self.status_var.set("Ready")
+            processed_files = result['processed_files']
+            status = self.resizer.folder_status(result)
+            if result['cancelled']:
+                self.folder_status_var.set(f"⏹ Cancelled - {len(processed_files)} images processed")
+                messagebox.showinfo("Cancelled", status)
+            # An incremental run where nothing changed is still a success
+            elif processed_files or result['copied_files'] or result['skipped_files']:
+                self.folder_status_var.set(f"✅ Success - {len(processed_files)} images processed")
+                messagebox.showinfo("Success", f"Folder processed successfully!\n\n{status}")
+            else:
+                self.folder_status_var.set(f"❌ Failed")
+                messagebox.showerror("Error", status)
+        
+        def failed(e):
+            self.folder_status_var.set(f"❌ Error: {str(e)}")
+            self.status_var.set("Ready")
+            messagebox.showerror("Error", f"Failed to process folder: {str(e)}")
         
         threading.Thread(target=process, daemon=True).start()
     
@@ -442,299 +681,81 @@ class ModernImageResizerApp:
             messagebox.showerror("Error", "Please select a zip file first")
             return
         
+        # Tk variables and dialogs are only touched here and in the callbacks below, on the UI thread
+        try:
+            zip_path = self.zip_path_var.get()
+            width = int(self.zip_width_var.get())
+            height = int(self.zip_height_var.get())
+            workers = int(self.zip_workers_var.get())
+            maintain_aspect = self.zip_maintain_aspect.get()
+            target_format = self.get_target_format(self.zip_format_var)
+            
+            # Get PNG background color option
+            png_bg_option = self.zip_png_bg_option.get()
+            custom_color = None
+            if png_bg_option == "custom":
+                custom_color = self.hex_to_rgb(self.zip_custom_color.get())
+        except ValueError as e:
+            self.zip_status_var.set(f"❌ Error: {str(e)}")
+            messagebox.showerror("Error", f"Failed to process zip file: {str(e)}")
+            return
+        
+        self.status_var.set("Processing zip file...")
+        self.zip_progress.configure(value=0)
+        self.zip_progress_var.set("")
+        self.zip_cancel_event = threading.Event()
+        progress_callback = self.make_progress_callback(self.zip_progress, self.zip_progress_var)
+        
         def process():
+            # Worker thread: results go back to the UI thread through root.after
             try:
-                self.status_var.set("Processing zip file...")
-                self.zip_progress.start()
-                self.root.update()
-                
-                width = int(self.zip_width_var.get())
-                height = int(self.zip_height_var.get())
-                maintain_aspect = self.zip_maintain_aspect.get()
-                
-                # Get PNG background color option
-                png_bg_option = self.zip_png_bg_option.get()
-                custom_color = None
-                if png_bg_option == "custom":
-                    custom_color = self.hex_to_rgb(self.zip_custom_color.get())
-                
                 output_zip, status = self.resizer.process_zip_file(
-                    self.zip_path_var.get(), width, height, maintain_aspect, png_bg_option, custom_color
+                    zip_path, width, height, maintain_aspect, png_bg_option, custom_color,
+                    workers=workers, target_format=target_format,
+                    progress_callback=progress_callback, cancel_event=self.zip_cancel_event
                 )
+            except Exception as e:
+                self.root.after(0, failed, e)
+                return
+            self.root.after(0, finished, output_zip, status)
+        
+        def finished(output_zip, status):
+            self.status_var.set("Ready")
+            if output_zip:
+                self.zip_status_var.set(f"✅ Success - ZIP processed")
                 
-                self.zip_progress.stop()
+                # Ask user where to save the output zip
+                save_path = filedialog.asksaveasfilename(
+                    title="Save Resized Images Zip",
+                    defaultextension=".zip",
+                    filetypes=[("Zip files", "*.zip")]
+                )
                 
-                if output_zip:
-                    self.zip_status_var.set(f"✅ Success - ZIP processed")
-                    
-                    # Ask user where to save the output zip
-                    save_path = filedialog.asksaveasfilename(
-                        title="Save Resized Images Zip",
-                        defaultextension=".zip",
-                        filetypes=[("Zip files", "*.zip")]
-                    )
-                    
-                    if save_path:
-                        shutil.move(output_zip, save_path)
-                        messagebox.showinfo("Success", f"Zip file processed and saved successfully!\n\n{status}\n\nSaved to: {save_path}")
-                    else:
-                        # Clean up if user cancelled save
-                        if os.path.exists(output_zip):
-                            os.remove(output_zip)
+                if save_path:
+                    shutil.move(output_zip, save_path)
+                    messagebox.showinfo("Success", f"Zip file processed and saved successfully!\n\n{status}\n\nSaved to: {save_path}")
                 else:
-                    self.zip_status_var.set(f"❌ Failed")
-                    messagebox.showerror("Error", status)
-                
-                self.status_var.set("Ready")
-                
-            except Exception as e:
-                self.zip_progress.stop()
-                self.zip_status_var.set(f"❌ Error: {str(e)}")
-                messagebox.showerror("Error", f"Failed to process zip file: {str(e)}")
-                self.status_var.set("Ready")
-        
-        threading.Thread(target=process, daemon=True).start()
-
-
-class ImageResizer:
-    def __init__(self):
-        self.supported_formats = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
-    
-    def get_background_color(self, image: Image.Image) -> tuple:
-        """Detect background color from image corners"""
-        try:
-            # Ensure image is in RGB mode
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            width, height = image.size
-            
-            # Sample corner pixels (avoid single pixel - use small area)
-            corner_size = min(10, width//10, height//10)  # 10x10 or smaller
-            
-            corners = []
-            # Top-left corner
-            corners.extend(list(image.crop((0, 0, corner_size, corner_size)).getdata()))
-            # Top-right corner  
-            corners.extend(list(image.crop((width-corner_size, 0, width, corner_size)).getdata()))
-            # Bottom-left corner
-            corners.extend(list(image.crop((0, height-corner_size, corner_size, height)).getdata()))
-            # Bottom-right corner
-            corners.extend(list(image.crop((width-corner_size, height-corner_size, width, height)).getdata()))
-            
-            # Calculate average color
-            if corners:
-                avg_r = sum(pixel[0] for pixel in corners) // len(corners)
-                avg_g = sum(pixel[1] for pixel in corners) // len(corners)
-                avg_b = sum(pixel[2] for pixel in corners) // len(corners)
-                return (avg_r, avg_g, avg_b)
-            
-        except Exception:
-            pass
-        
-        # Fallback to white if detection fails
-        return (255, 255, 255)
-
-    def resize_image(self, image: Image.Image, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, is_png: bool = False) -> Image.Image:
-        """Add smart background canvas padding to image to reach target dimensions"""
-        
-        # Special handling for PNG files
-        if image.format == 'PNG' or is_png:
-            # Check if PNG has transparency
-            has_transparency = False
-            if image.mode == 'RGBA':
-                alpha = image.getchannel('A')
-                has_transparency = any(pixel < 255 for pixel in alpha.getdata())
-            
-            # Choose background color based on user selection
-            if png_bg_option == "black":
-                bg_color = (0, 0, 0)
-            elif png_bg_option == "white":
-                bg_color = (255, 255, 255)
-            elif png_bg_option == "custom" and custom_color:
-                bg_color = custom_color
-            elif png_bg_option == "auto":
-                if has_transparency:
-                    # For transparent PNG, use black background by default
-                    bg_color = (0, 0, 0)
-                else:
-                    # For non-transparent PNG, detect background color
-                    bg_color = self.get_background_color(image)
+                    # Clean up if user cancelled save
+                    if os.path.exists(output_zip):
+                        os.remove(output_zip)
+            elif self.zip_cancel_event.is_set():
+                self.zip_status_var.set("⏹ Cancelled")
+                messagebox.showinfo("Cancelled", status)
             else:
-                # Fallback to auto-detection
-                bg_color = self.get_background_color(image)
-        else:
-            # For non-PNG images, use smart background detection
-            bg_color = self.get_background_color(image)
-        
-        # Create canvas with detected/selected background color
-        canvas = Image.new('RGB', (width, height), color=bg_color)
-        
-        # Calculate position to center the original image
-        orig_width, orig_height = image.size
+                self.zip_status_var.set(f"❌ Failed")
+                messagebox.showerror("Error", status)
         
-        if maintain_aspect:
-            # Scale down image if it's larger than target canvas
-            if orig_width > width or orig_height > height:
-                image.thumbnail((width, height), Image.Resampling.LANCZOS)
-                orig_width, orig_height = image.size
+        def failed(e):
+            self.zip_status_var.set(f"❌ Error: {str(e)}")
+            self.status_var.set("Ready")
+            messagebox.showerror("Error", f"Failed to process zip file: {str(e)}")
         
-        # Calculate center position
-        x = (width - orig_width) // 2
-        y = (height - orig_height) // 2
-        
-        # Handle different image modes for pasting
-        if image.mode == 'RGBA':
-            # For RGBA images (transparent PNG), paste with alpha mask
-            canvas.paste(image, (x, y), image)
-        else:
-            # Ensure image has RGB mode for pasting
-            if image.mode in ('LA', 'P'):
-                image = image.convert('RGB')
-            # Paste original image onto smart background canvas
-            canvas.paste(image, (x, y))
-        
-        return canvas
-    
-    def process_single_image_file(self, image_path: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None) -> str:
-        """Process a single image file and save it"""
-        try:
-            # Open and resize the image
-            image = Image.open(image_path)
-            
-            # Check if file is PNG based on extension
-            is_png = image_path.lower().endswith(('.png',))
-            
-            original_size = image.size
-            resized_image = self.resize_image(image, width, height, maintain_aspect, png_bg_option, custom_color, is_png)
-            new_size = resized_image.size
-            
-            # Ask user where to save the resized image
-            from tkinter import filedialog
-            name, ext = os.path.splitext(image_path)
-            suggested_name = f"{os.path.basename(name)}{ext}"
-            
-            # Ask user for save location
-            output_path = filedialog.asksaveasfilename(
-                title="Save Resized Image",
-                defaultextension=ext,
-                initialfile=suggested_name,
-                filetypes=[
-                    ("Image files", "*.jpg *.jpeg *.png *.bmp *.tiff *.webp"),
-                    ("All files", "*.*")
-                ]
-            )
-            
-            if not output_path:
-                return "Save cancelled by user"
-                
-            resized_image.save(output_path, quality=95)
-            
-            return f"Original: {original_size[0]}x{original_size[1]} → Resized: {new_size[0]}x{new_size[1]}\nSaved to: {output_path}"
-            
-        except Exception as e:
-            raise Exception(f"Error processing image: {str(e)}")
-    
-    def process_folder(self, folder_path: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None) -> Tuple[List[str], str]:
-        """Process all images in a folder"""
-        if not folder_path or not os.path.exists(folder_path):
-            return [], "Invalid folder path"
-        
-        processed_files = []
-        error_files = []
-        
-        # Create output directory
-        output_dir = os.path.join(os.path.dirname(folder_path), f"resized_{os.path.basename(folder_path)}")
-        os.makedirs(output_dir, exist_ok=True)
-        
-        for filename in os.listdir(folder_path):
-            if filename.lower().endswith(self.supported_formats):
-                try:
-                    file_path = os.path.join(folder_path, filename)
-                    image = Image.open(file_path)
-                    
-                    # Check if file is PNG based on extension
-                    is_png = filename.lower().endswith(('.png',))
-                    
-                    resized_image = self.resize_image(image, width, height, maintain_aspect, png_bg_option, custom_color, is_png)
-                    
-                    # Save resized image (without _resized suffix)
-                    output_path = os.path.join(output_dir, filename)
-                    resized_image.save(output_path, quality=95)
-                    processed_files.append(output_path)
-                    
-                except Exception as e:
-                    error_files.append(f"{filename}: {str(e)}")
-        
-        status = f"Processed {len(processed_files)} images successfully\nOutput folder: {output_dir}"
-        if error_files:
-            status += f"\nErrors with {len(error_files)} files: {'; '.join(error_files[:3])}"
-        
-        return processed_files, status
-    
-    def process_zip_file(self, zip_path: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None) -> Tuple[str, str]:
-        """Process images from a zip file and return a new zip with resized images"""
-        try:
-            # Create temporary directories
-            temp_extract_dir = tempfile.mkdtemp()
-            temp_output_dir = tempfile.mkdtemp()
-            
-            # Extract zip file
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_extract_dir)
-            
-            processed_count = 0
-            error_files = []
-            
-            # Process all images in extracted folder
-            for root, dirs, files in os.walk(temp_extract_dir):
-                for filename in files:
-                    if filename.lower().endswith(self.supported_formats):
-                        try:
-                            file_path = os.path.join(root, filename)
-                            image = Image.open(file_path)
-                            
-                            # Check if file is PNG based on extension
-                            is_png = filename.lower().endswith(('.png',))
-                            
-                            resized_image = self.resize_image(image, width, height, maintain_aspect, png_bg_option, custom_color, is_png)
-                            
-                            # Maintain folder structure in output
-                            rel_path = os.path.relpath(file_path, temp_extract_dir)
-                            output_path = os.path.join(temp_output_dir, rel_path)
-                            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                            
-                            # Save without _resized suffix (same filename as original)
-                            resized_image.save(output_path, quality=95)
-                            processed_count += 1
-                            
-                        except Exception as e:
-                            error_files.append(f"{filename}: {str(e)}")
-            
-            # Create output zip file
-            output_zip_path = tempfile.mktemp(suffix='.zip')
-            with zipfile.ZipFile(output_zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_out:
-                for root, dirs, files in os.walk(temp_output_dir):
-                    for filename in files:
-                        file_path = os.path.join(root, filename)
-                        arcname = os.path.relpath(file_path, temp_output_dir)
-                        zip_out.write(file_path, arcname)
-            
-            # Clean up temporary directories
-            shutil.rmtree(temp_extract_dir)
-            shutil.rmtree(temp_output_dir)
-            
-            status = f"Processed {processed_count} images successfully"
-            if error_files:
-                status += f"\nErrors with {len(error_files)} files: {'; '.join(error_files[:3])}"
-            
-            return output_zip_path, status
-            
-        except Exception as e:
-            return None, f"Error processing zip file: {str(e)}"
+        threading.Thread(target=process, daemon=True).start()
 
 
 def main():
+    # Required for worker processes when running as a frozen (PyInstaller) app
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = ModernImageResizerApp(root)
     root.mainloop()
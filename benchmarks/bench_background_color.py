@@ -0,0 +1,66 @@
+"""Microbenchmark for ImageResizer.get_background_color
+
+Compares the original whole-image convert + Python averaging against the
+corner-only ImageStat path, for each estimator.
+
+Usage: python benchmarks/bench_background_color.py [--megapixels 40] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import timeit
+import warnings
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_resizer import ImageResizer
+
+
+def legacy_background_color(image: Image.Image) -> tuple:
+    """The pre-optimisation implementation, kept here as the baseline"""
+    # getdata() is deprecated in newer Pillow, which is part of why this was replaced
+    warnings.simplefilter('ignore', DeprecationWarning)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    width, height = image.size
+    corner_size = min(10, width//10, height//10)
+    corners = []
+    corners.extend(list(image.crop((0, 0, corner_size, corner_size)).getdata()))
+    corners.extend(list(image.crop((width-corner_size, 0, width, corner_size)).getdata()))
+    corners.extend(list(image.crop((0, height-corner_size, corner_size, height)).getdata()))
+    corners.extend(list(image.crop((width-corner_size, height-corner_size, width, height)).getdata()))
+    avg_r = sum(pixel[0] for pixel in corners) // len(corners)
+    avg_g = sum(pixel[1] for pixel in corners) // len(corners)
+    avg_b = sum(pixel[2] for pixel in corners) // len(corners)
+    return (avg_r, avg_g, avg_b)
+
+
+def make_image(megapixels: float, mode: str) -> Image.Image:
+    """Build a decoded synthetic image with a flat background and a centred subject"""
+    side = int((megapixels * 1_000_000) ** 0.5)
+    image = Image.new('RGB', (side, side), color=(240, 240, 235))
+    image.paste((30, 60, 90), (side // 4, side // 4, side * 3 // 4, side * 3 // 4))
+    return image.convert(mode)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--megapixels', type=float, default=40)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    resizer = ImageResizer()
+    print(f"{'mode':<6}{'variant':<10}{'ms/call':>10}{'speedup':>10}  color")
+    for mode in ('RGB', 'RGBA', 'L'):
+        image = make_image(args.megapixels, mode)
+        baseline = min(timeit.repeat(lambda: legacy_background_color(image), number=1, repeat=args.repeat))
+        print(f"{mode:<6}{'legacy':<10}{baseline * 1000:>10.2f}{1:>10.1f}x  {legacy_background_color(image)}")
+        for estimator in resizer.background_estimators:
+            elapsed = min(timeit.repeat(lambda: resizer.get_background_color(image, estimator), number=1, repeat=args.repeat))
+            color = resizer.get_background_color(image, estimator)
+            print(f"{mode:<6}{estimator:<10}{elapsed * 1000:>10.2f}{baseline / elapsed:>10.1f}x  {color}")
+
+
+if __name__ == "__main__":
+    main()
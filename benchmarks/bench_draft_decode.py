@@ -0,0 +1,61 @@
+"""Benchmark full-resolution vs draft (DCT-scaled) JPEG decoding in resize_image
+
+Encodes a synthetic photo-like JPEG, then times decode + resize_image for a
+full decode and for several reducing_gap settings. Quality is reported as
+PSNR against the full-decode output.
+
+Usage: python benchmarks/bench_draft_decode.py [--size 6000x4000] [--target 800x800] [--repeat 3]
+"""
+import argparse
+import io
+import math
+import os
+import sys
+import timeit
+
+from PIL import Image, ImageChops, ImageStat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_resizer import ImageResizer
+from helpers import make_photo, parse_size
+
+
+def make_jpeg(size: tuple) -> bytes:
+    """Encode a JPEG with gradients and fine detail so downscaling quality is visible"""
+    output = io.BytesIO()
+    make_photo(size).save(output, format='JPEG', quality=92)
+    return output.getvalue()
+
+
+def psnr(a: Image.Image, b: Image.Image) -> float:
+    mse = sum(value ** 2 for value in ImageStat.Stat(ImageChops.difference(a, b)).rms) / 3
+    return float('inf') if mse == 0 else 20 * math.log10(255 / math.sqrt(mse))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=parse_size, default=(6000, 4000))
+    parser.add_argument('--target', type=parse_size, default=(800, 800))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = make_jpeg(args.size)
+    width, height = args.target
+
+    def run(reducing_gap):
+        image = Image.open(io.BytesIO(data))
+        return ImageResizer(reducing_gap=reducing_gap).resize_image(image, width, height)
+
+    reference = run(None)
+    baseline = min(timeit.repeat(lambda: run(None), number=1, repeat=args.repeat))
+    print(f"{args.size[0]}x{args.size[1]} JPEG -> {width}x{height} canvas")
+    print(f"{'reducing_gap':<14}{'ms':>10}{'speedup':>10}{'PSNR dB':>10}")
+    print(f"{'full decode':<14}{baseline * 1000:>10.1f}{1:>10.1f}x{'ref':>10}")
+    for reducing_gap in (3.0, 2.0, 1.0):
+        elapsed = min(timeit.repeat(lambda: run(reducing_gap), number=1, repeat=args.repeat))
+        quality = psnr(reference, run(reducing_gap))
+        print(f"{reducing_gap:<14}{elapsed * 1000:>10.1f}{baseline / elapsed:>10.1f}x{quality:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Benchmark encode time vs. output bytes for each ImageResizer encoder profile
+
+Renders a synthetic photo-like image onto a padded canvas once, then encodes
+it in every supported format with the legacy quality=95 save and each profile.
+
+Usage: python benchmarks/bench_encoder_profiles.py [--size 1600x1200] [--repeat 3]
+"""
+import argparse
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_resizer import ImageResizer
+from helpers import make_photo, parse_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=parse_size, default=(1600, 1200))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # A resized-looking output: a textured subject on a flat background
+    canvas = make_photo(args.size)
+    profiles = [None] + list(ImageResizer.encoder_profiles)
+    print(f"{'format':<8}{'profile':<10}{'encode ms':>11}{'bytes':>12}{'vs legacy':>11}")
+    for format in ('JPEG', 'PNG', 'WEBP', 'TIFF'):
+        legacy_bytes = None
+        for profile in profiles:
+            resizer = ImageResizer(encoder_profile=profile)
+
+            def encode():
+                output = io.BytesIO()
+                resizer.save_image(canvas, output, format)
+                return output
+
+            try:
+                size = len(encode().getvalue())
+            except (OSError, ValueError) as e:
+                # e.g. TIFF compression that this Pillow build lacks
+                print(f"{format:<8}{profile or 'legacy':<10}  unavailable: {e}")
+                continue
+            elapsed = min(timeit.repeat(encode, number=1, repeat=args.repeat))
+            legacy_bytes = legacy_bytes or size
+            print(f"{format:<8}{profile or 'legacy':<10}{elapsed * 1000:>11.1f}{size:>12,}{size / legacy_bytes:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Benchmark per-image background detection against a background shared by the batch
+
+Times resize_image on a decoded catalogue-style image, by default one that only needs
+padding so the background stage isn't lost in resampling noise, with the background detected
+per image (background_scope='image') and with a precomputed color, as batch runs
+pass it for background_scope='folder' or 'batch'. Also times allocating a filled
+canvas against copying a cached template canvas, the alternative that was measured
+and not adopted.
+
+Usage: python benchmarks/bench_shared_background.py [--size 760x560] [--target 800x600] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_resizer import ImageResizer
+from helpers import parse_size
+
+
+def make_image(size: tuple) -> Image.Image:
+    """Build a decoded product shot: a flat backdrop with a centred subject"""
+    width, height = size
+    image = Image.new('RGB', size, color=(240, 240, 235))
+    image.paste((30, 60, 90), (width // 4, height // 4, width * 3 // 4, height * 3 // 4))
+    return image
+
+
+def per_call(func, repeat: int, number: int = 200) -> float:
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=parse_size, default=(760, 560))
+    parser.add_argument('--target', type=parse_size, default=(800, 600))
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    source = make_image(args.size)
+    width, height = args.target
+    print(f"{args.size[0]}x{args.size[1]} -> {width}x{height} canvas")
+    print(f"{'estimator':<10}{'detect ms':>12}{'shared ms':>12}{'saved us/img':>14}")
+    for estimator in ImageResizer.background_estimators:
+        resizer = ImageResizer(estimator)
+        background = resizer.get_background_color(source)
+        detect = per_call(lambda: resizer.resize_image(source.copy(), width, height), args.repeat)
+        shared = per_call(lambda: resizer.resize_image(source.copy(), width, height, background=background), args.repeat)
+        print(f"{estimator:<10}{detect * 1000:>12.3f}{shared * 1000:>12.3f}{(detect - shared) * 1e6:>14.0f}")
+
+    template = Image.new('RGB', (width, height), color=(240, 240, 235))
+    fresh = per_call(lambda: Image.new('RGB', (width, height), color=(240, 240, 235)), args.repeat)
+    copied = per_call(template.copy, args.repeat)
+    print(f"canvas: Image.new {fresh * 1e6:.0f} us, template copy {copied * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
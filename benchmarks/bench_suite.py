@@ -0,0 +1,274 @@
+"""Benchmark suite for the ImageResizer hot paths, with JSON baselines
+
+Generates a synthetic corpus (JPEG, PNG, RGBA PNG, palette PNG and TIFF at
+several resolutions, plus a zip of it), then measures:
+
+  * per-stage times for one image of each kind, from the resizer's own stage
+    timers: open, decode, background detection, resample, paste and encode
+  * zip read and write throughput
+  * end-to-end batch_folder and batch_zip runs: images/sec, MB/s of input and
+    peak memory, each run in a fresh process so peaks don't carry over
+
+Results can be saved as a baseline and later runs compared against it.
+
+Usage: python benchmarks/bench_suite.py [--sizes 640x480,2000x1500,4000x3000] [--copies 4]
+                                        [--workers 0] [--repeat 3] [--corpus DIR]
+                                        [--save-baseline base.json] [--compare base.json] [--tolerance 0.1]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import PIL
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_resizer import BatchEngine, ImageResizer, peak_rss
+from helpers import make_photo, parse_size
+
+# Kind of input -> (file extension, builder from an RGB photo)
+KINDS = {
+    'jpeg': ('.jpg', lambda photo: photo),
+    'png': ('.png', lambda photo: photo),
+    'png_rgba': ('.png', lambda photo: with_transparent_margin(photo)),
+    'png_palette': ('.png', lambda photo: photo.quantize(256)),
+    'tiff': ('.tiff', lambda photo: photo),
+}
+
+# Stages timed inside ImageResizer.resize_bytes, in the order they run
+STAGES = ('open', 'decode', 'background', 'resample', 'paste', 'encode')
+
+
+def parse_sizes(value: str) -> list:
+    return [parse_size(size) for size in value.split(',')]
+
+
+def with_transparent_margin(photo: Image.Image) -> Image.Image:
+    image = photo.convert('RGBA')
+    alpha = Image.new('L', photo.size, 0)
+    alpha.paste(255, (photo.width // 8, photo.height // 8, photo.width * 7 // 8, photo.height * 7 // 8))
+    image.putalpha(alpha)
+    return image
+
+
+def build_corpus(corpus_dir: str, sizes: list, copies: int) -> dict:
+    """Write copies of every kind at every size into corpus_dir/images, zip them, and return {(kind, size): sample path}"""
+    image_dir = os.path.join(corpus_dir, 'images')
+    os.makedirs(image_dir, exist_ok=True)
+    samples = {}
+    for size in sizes:
+        photo = make_photo(size)
+        for kind, (ext, build) in KINDS.items():
+            image = build(photo)
+            options = {'compression': 'tiff_lzw'} if ext == '.tiff' else {'quality': 90} if ext == '.jpg' else {}
+            for copy in range(copies):
+                path = os.path.join(image_dir, f"{kind}_{size[0]}x{size[1]}_{copy}{ext}")
+                if not os.path.exists(path):
+                    image.save(path, **options)
+                samples.setdefault((kind, size), path)
+
+    zip_path = os.path.join(corpus_dir, 'images.zip')
+    if not os.path.exists(zip_path):
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_out:
+            for filename in sorted(os.listdir(image_dir)):
+                zip_out.write(os.path.join(image_dir, filename), filename)
+    return samples
+
+
+def time_stages(resizer: ImageResizer, path: str, width: int, height: int, repeat: int) -> dict:
+    """Best-of-repeat milliseconds for each stage of ImageResizer.resize_bytes on path onto a width x height canvas
+    
+    Stages come from the resizer's own stage timers, so draft decoding, the pass-through
+    and PNG paths are measured exactly as batch runs execute them.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    engine = BatchEngine(resizer, workers=1)
+    args = (data, os.path.basename(path), width, height)
+    best = {}
+    for _ in range(repeat):
+        for key, result, error, elapsed in engine.run('resize_bytes', [(path, args)]):
+            if error is not None:
+                raise RuntimeError(f"{path}: {error}")
+            times = engine.pop_stages(key)
+            times['total'] = elapsed
+        for stage in STAGES + ('total',):
+            elapsed = times.get(stage, 0.0)
+            best[stage] = min(best.get(stage, elapsed), elapsed)
+    return {f"{stage}_ms": best[stage] * 1000 for stage in STAGES + ('total',)}
+
+
+def time_zip_io(zip_path: str, repeat: int) -> dict:
+    """Best-of-repeat throughput of reading every member and of writing them to a new deflated zip"""
+    read_best = write_best = float('inf')
+    with zipfile.ZipFile(zip_path) as zip_ref:
+        total = sum(member.file_size for member in zip_ref.infolist())
+        for _ in range(repeat):
+            start = time.perf_counter()
+            members = [(member.filename, zip_ref.read(member)) for member in zip_ref.infolist()]
+            read_best = min(read_best, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            with zipfile.ZipFile(io.BytesIO(), 'w', zipfile.ZIP_DEFLATED) as zip_out:
+                for name, data in members:
+                    zip_out.writestr(name, data)
+            write_best = min(write_best, time.perf_counter() - start)
+    megabytes = total / (1024 * 1024)
+    return {'read_mb_per_second': megabytes / read_best, 'write_mb_per_second': megabytes / write_best}
+
+
+def run_batch(mode: str, path: str, width: int, height: int, workers: int) -> dict:
+    """One end-to-end batch run; called in a fresh process so peak memory is its own"""
+    resizer = ImageResizer()
+    start = time.perf_counter()
+    if mode == 'folder':
+        result = resizer.batch_folder(path, width, height, workers=workers)
+        wall = time.perf_counter() - start
+        images = len(result['processed_files']) + len(result['copied_files'])
+        shutil.rmtree(result['output_dir'])
+    else:
+        result = resizer.batch_zip(path, width, height, workers=workers)
+        wall = time.perf_counter() - start
+        images = result['processed_count'] + result['copied_count']
+        os.remove(result['output_zip'])
+    return {'images': images, 'errors': len(result['errors']), 'wall_seconds': wall, 'peak_rss': peak_rss()}
+
+
+def time_batches(corpus_dir: str, width: int, height: int, workers: int) -> dict:
+    image_dir = os.path.join(corpus_dir, 'images')
+    zip_path = os.path.join(corpus_dir, 'images.zip')
+    input_bytes = {
+        'folder': sum(os.path.getsize(os.path.join(image_dir, name)) for name in os.listdir(image_dir)),
+        'zip': os.path.getsize(zip_path),
+    }
+    results = {}
+    for mode, path in (('folder', image_dir), ('zip', zip_path)):
+        for worker_count in sorted({1, workers}):
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                run = executor.submit(run_batch, mode, path, width, height, worker_count).result()
+            megabytes = input_bytes[mode] / (1024 * 1024)
+            results[f"{mode} workers={worker_count}"] = {
+                'images_per_second': run['images'] / run['wall_seconds'],
+                'mb_per_second': megabytes / run['wall_seconds'],
+                'wall_seconds': run['wall_seconds'],
+                'peak_rss_mb': max(run['peak_rss'].values()) if run['peak_rss'] else None,
+                'errors': run['errors'],
+            }
+    return results
+
+
+def flatten(results: dict, prefix: str = '') -> dict:
+    """Turn nested results into {'section/case/metric': number}"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_ms: float) -> int:
+    """Print metrics that moved by more than tolerance and return the number of regressions"""
+    current = flatten({key: results[key] for key in ('stages', 'zip_io', 'batch')})
+    previous = flatten({key: baseline.get(key, {}) for key in ('stages', 'zip_io', 'batch')})
+    regressions = 0
+    print(f"\nCompared with baseline ({tolerance:.0%} tolerance):")
+    for name in sorted(current.keys() & previous.keys()):
+        old, new = previous[name], current[name]
+        if not old or name.endswith('/errors'):
+            continue
+        # Sub-millisecond stages are dominated by timer noise
+        if name.endswith('_ms') and max(old, new) < min_ms:
+            continue
+        # Rates are better when higher; times and memory when lower
+        higher_is_better = name.endswith('per_second')
+        change = (new - old) / old
+        worse = change < -tolerance if higher_is_better else change > tolerance
+        better = change > tolerance if higher_is_better else change < -tolerance
+        if worse or better:
+            regressions += worse
+            print(f"  {'REGRESSION' if worse else 'improved':<11}{name:<60}{old:>12.2f} -> {new:>12.2f} ({change:+.0%})")
+    missing = previous.keys() - current.keys()
+    if missing:
+        print(f"  {len(missing)} baseline metrics not measured in this run")
+    if not regressions:
+        print("  no regressions")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=parse_sizes, default=parse_sizes('640x480,2000x1500,4000x3000'))
+    parser.add_argument('--target', type=parse_size, default=(800, 600), help="canvas size (default: 800x600)")
+    parser.add_argument('--copies', type=int, default=4, help="copies of each kind and size in the batch corpus")
+    parser.add_argument('--workers', type=int, default=0, help="workers for the parallel batch runs, 0 for one per core")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--corpus', help="keep the generated corpus in this directory and reuse it on later runs")
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH', help="baseline JSON to compare against; exits 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="relative change ignored when comparing (default: 0.1)")
+    parser.add_argument('--min-ms', type=float, default=1.0, help="stage times below this are not compared (default: 1.0)")
+    args = parser.parse_args()
+
+    width, height = args.target
+    workers = args.workers or os.cpu_count() or 1
+    corpus_dir = args.corpus or tempfile.mkdtemp(prefix='resizer_bench_')
+    try:
+        samples = build_corpus(corpus_dir, args.sizes, args.copies)
+        # Instrumented so each job reports its stage timings
+        resizer = ImageResizer(instrument=True)
+
+        stages = {}
+        print(f"{'input':<26}" + ''.join(f"{stage:>14}" for stage in STAGES) + f"{'total ms':>12}")
+        for (kind, size), path in samples.items():
+            case = f"{kind} {size[0]}x{size[1]}"
+            stages[case] = time_stages(resizer, path, width, height, args.repeat)
+            print(f"{case:<26}" + ''.join(f"{stages[case][stage + '_ms']:>14.2f}" for stage in STAGES) + f"{stages[case]['total_ms']:>12.1f}")
+
+        zip_io = time_zip_io(os.path.join(corpus_dir, 'images.zip'), args.repeat)
+        print(f"\nzip read {zip_io['read_mb_per_second']:.1f} MB/s, write {zip_io['write_mb_per_second']:.1f} MB/s")
+
+        batch = time_batches(corpus_dir, width, height, workers)
+        print(f"\n{'batch':<22}{'images/s':>10}{'MB/s':>10}{'wall s':>10}{'peak MB':>10}")
+        for case, run in batch.items():
+            peak = f"{run['peak_rss_mb']:.0f}" if run['peak_rss_mb'] is not None else 'n/a'
+            print(f"{case:<22}{run['images_per_second']:>10.1f}{run['mb_per_second']:>10.1f}{run['wall_seconds']:>10.2f}{peak:>10}")
+    finally:
+        if not args.corpus:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    results = {
+        'environment': {'python': platform.python_version(), 'pillow': PIL.__version__,
+                        'platform': platform.platform(), 'cpu_count': os.cpu_count()},
+        'config': {'sizes': [list(size) for size in args.sizes], 'target': [width, height],
+                   'copies': args.copies, 'workers': workers, 'repeat': args.repeat},
+        'stages': stages,
+        'zip_io': zip_io,
+        'batch': batch,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != results['config']:
+            print("\nWarning: baseline was recorded with a different configuration")
+        return 1 if compare(results, baseline, args.tolerance, args.min_ms) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
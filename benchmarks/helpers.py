@@ -0,0 +1,19 @@
+"""Shared helpers for the benchmark scripts: argument parsing and synthetic images"""
+from PIL import Image, ImageFilter
+
+
+def parse_size(value: str) -> tuple:
+    """Parse a WIDTHxHEIGHT argument"""
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def make_photo(size: tuple) -> Image.Image:
+    """A photo-like RGB image: gradients with fine detail on a flat border"""
+    width, height = size
+    gradient = Image.linear_gradient('L').resize((width * 3 // 4, height * 3 // 4))
+    noise = Image.effect_noise(gradient.size, 48).filter(ImageFilter.GaussianBlur(1))
+    subject = Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.ROTATE_180)))
+    photo = Image.new('RGB', size, (238, 236, 230))
+    photo.paste(subject, (width // 8, height // 8))
+    return photo
@@ -0,0 +1,2103 @@
+import asyncio
+import cProfile
+import csv
+import functools
+import hashlib
+import io
+import itertools
+import json
+import os
+import queue
+import zipfile
+import zlib
+import tempfile
+import shutil
+import signal
+import sys
+import threading
+import time
+from PIL import Image, ImageStat, UnidentifiedImageError
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Iterable, Iterator, List, Tuple, Optional
+
+
+class ImageResizer:
+    # Ways of reducing the sampled corner pixels to one background color
+    background_estimators = ('mean', 'median', 'mode')
+    
+    # How widely batch runs share one detected background: per image, per subfolder or per batch
+    background_scopes = ('image', 'folder', 'batch')
+    
+    # Save options per Pillow format name, trading encode CPU for output bytes.
+    # Formats not listed (e.g. BMP) are saved with Pillow's defaults.
+    encoder_profiles = {
+        'fast': {
+            'JPEG': {'quality': 90, 'optimize': False, 'progressive': False, 'subsampling': '4:2:0'},
+            'PNG': {'compress_level': 1},
+            'WEBP': {'quality': 85, 'method': 0},
+            'TIFF': {'compression': 'raw'},
+        },
+        'balanced': {
+            'JPEG': {'quality': 90, 'optimize': True, 'progressive': False, 'subsampling': '4:2:0'},
+            'PNG': {'compress_level': 6},
+            'WEBP': {'quality': 85, 'method': 4},
+            'TIFF': {'compression': 'tiff_lzw'},
+        },
+        'smallest': {
+            'JPEG': {'quality': 85, 'optimize': True, 'progressive': True, 'subsampling': '4:2:0'},
+            'PNG': {'compress_level': 9},
+            'WEBP': {'quality': 80, 'method': 6},
+            'TIFF': {'compression': 'tiff_adobe_deflate'},
+        },
+    }
+    
+    # Output formats batch runs can convert to, with the extension given to converted files
+    target_formats = {'jpeg': '.jpg', 'png': '.png', 'webp': '.webp', 'tiff': '.tiff', 'bmp': '.bmp', 'avif': '.avif'}
+    
+    # Outputs whose encoders already compress, so deflating them in a zip costs CPU for next to nothing
+    stored_zip_extensions = ('.jpg', '.jpeg', '.png', '.webp', '.avif', '.gif')
+    
+    # Fast decode fallback for JPEGs too large to decode in full within the memory budget
+    budget_reducing_gap = 2.0
+    
+    def __init__(self, background_estimator: str = "mean", reducing_gap: Optional[float] = None, encoder_profile=None, memory_budget_mb: Optional[float] = None, pass_through: bool = True, instrument: bool = False, profile_dir: Optional[str] = None, zip_compresslevel: Optional[int] = None, background_scope: str = "image", frame_workers: Optional[int] = None):
+        self.supported_formats = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
+        if background_estimator not in self.background_estimators:
+            raise ValueError(f"Unknown background estimator: {background_estimator}")
+        self.background_estimator = background_estimator
+        # Fast decode knob: None decodes at full resolution, otherwise JPEGs are
+        # decoded at a reduced DCT scale no smaller than reducing_gap x the target.
+        # Lower is faster (1.0 is fastest), higher is closer to a full decode.
+        if reducing_gap is not None and reducing_gap < 1.0:
+            raise ValueError("reducing_gap must be at least 1.0")
+        self.reducing_gap = reducing_gap
+        # None keeps the original quality=95 save; otherwise a profile name from
+        # encoder_profiles or a custom {format: save options} dict
+        if isinstance(encoder_profile, str) and encoder_profile not in self.encoder_profiles:
+            raise ValueError(f"Unknown encoder profile: {encoder_profile}")
+        self.encoder_profile = encoder_profile
+        # None leaves memory unmanaged; otherwise batch runs only admit jobs while their
+        # estimated decoded size fits, and oversized JPEGs are decoded at reduced scale
+        if memory_budget_mb is not None and memory_budget_mb <= 0:
+            raise ValueError("memory_budget_mb must be positive")
+        self.memory_budget_mb = memory_budget_mb
+        # Batch runs copy sources that already fill the canvas in the output format
+        # byte for byte, instead of decoding and re-encoding them
+        self.pass_through = pass_through
+        # Opt-in diagnostics: per-file stage timings in a RunReport on batch results,
+        # and a cProfile dump per process written into profile_dir
+        self.instrument = instrument
+        self.profile_dir = profile_dir
+        # Deflate level (0-9) for zip members that aren't already compressed, None for zlib's default
+        if zip_compresslevel is not None and not 0 <= zip_compresslevel <= 9:
+            raise ValueError("zip_compresslevel must be between 0 and 9")
+        self.zip_compresslevel = zip_compresslevel
+        # Catalogue shoots share one backdrop, so batch runs can detect it from a reference
+        # image of each folder (or of the batch) and skip detection for the rest
+        if background_scope not in self.background_scopes:
+            raise ValueError(f"Unknown background scope: {background_scope}")
+        self.background_scope = background_scope
+        # Threads resizing the frames of one animated or multi-page image, None for one per CPU core
+        # (or a single one inside BatchEngine worker processes, which already use every core)
+        if frame_workers is not None and frame_workers < 1:
+            raise ValueError("frame_workers must be at least 1")
+        self.frame_workers = frame_workers
+    
+    def timed(self, stage: str):
+        """Context manager adding the time spent in its block to stage while an instrumented job runs on this thread"""
+        stages = getattr(_job_stages, 'stages', None)
+        if stages is None:
+            return nullcontext()
+        return _stage_timer(stages, stage)
+    
+    def encoder_options(self, format: str) -> dict:
+        """Return the save() options for a Pillow format name under the current encoder profile"""
+        if self.encoder_profile is None:
+            return {'quality': 95}
+        profile = self.encoder_profile
+        if isinstance(profile, str):
+            profile = self.encoder_profiles[profile]
+        return dict(profile.get(format.upper(), {}))
+    
+    def save_image(self, image: Image.Image, fp, format: Optional[str] = None, **save_options):
+        """Encode image to a path or file object with the encoder profile for its format, plus any extra save() options"""
+        if format is None:
+            format = self.path_format(fp)
+        with self.timed('encode'):
+            if format.upper() == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+                # JPEG has no alpha channel or palette
+                image = image.convert('RGB')
+            image.save(fp, format=format, **self.encoder_options(format), **save_options)
+    
+    def path_format(self, path: str) -> str:
+        """Infer the Pillow format name from a file extension, as Image.save would"""
+        ext = os.path.splitext(path)[1].lower()
+        format = Image.registered_extensions().get(ext)
+        if format is None:
+            raise ValueError(f"unknown file extension: {ext}")
+        return format
+    
+    def output_name(self, filename: str, target_format: Optional[str] = None) -> str:
+        """Return the output file name for filename, with the extension of target_format if converting"""
+        if target_format is None:
+            return filename
+        return os.path.splitext(filename)[0] + self.target_formats[target_format]
+    
+    def check_target_format(self, target_format: Optional[str]) -> Optional[str]:
+        """Normalise a target format name, raising ValueError if it can't be written"""
+        if target_format is None:
+            return None
+        target_format = target_format.lower()
+        if target_format == 'jpg':
+            target_format = 'jpeg'
+        if target_format not in self.target_formats:
+            raise ValueError(f"Unsupported output format: {target_format}")
+        Image.init()
+        if target_format.upper() not in Image.SAVE:
+            raise ValueError(f"This Pillow build cannot write {target_format.upper()}")
+        return target_format
+    
+    def get_background_color(self, image: Image.Image, estimator: Optional[str] = None) -> tuple:
+        """Detect background color from image corners"""
+        estimator = estimator or self.background_estimator
+        if estimator not in self.background_estimators:
+            raise ValueError(f"Unknown background estimator: {estimator}")
+        
+        try:
+            width, height = image.size
+            
+            # Sample corner pixels (avoid single pixel - use small area)
+            corner_size = min(10, width//10, height//10)  # 10x10 or smaller
+            
+            if corner_size > 0:
+                boxes = [
+                    (0, 0, corner_size, corner_size),  # Top-left
+                    (width-corner_size, 0, width, corner_size),  # Top-right
+                    (0, height-corner_size, corner_size, height),  # Bottom-left
+                    (width-corner_size, height-corner_size, width, height),  # Bottom-right
+                ]
+                
+                # Crop first and convert only the corners, never the whole image
+                corners = Image.new('RGB', (corner_size * len(boxes), corner_size))
+                for i, box in enumerate(boxes):
+                    corner = image.crop(box)
+                    if corner.mode != 'RGB':
+                        corner = corner.convert('RGB')
+                    corners.paste(corner, (i * corner_size, 0))
+                
+                if estimator == "median":
+                    # Robust against noise and small objects touching an edge
+                    return tuple(ImageStat.Stat(corners).median)
+                if estimator == "mode":
+                    # Most frequent exact color, for flat backgrounds with noisy edges
+                    count, color = max(corners.getcolors(corners.width * corners.height))
+                    return color
+                
+                # Average color, floored like the original per-pixel average
+                return tuple(int(value) for value in ImageStat.Stat(corners).mean)
+            
+        except Exception:
+            pass
+        
+        # Fallback to white if detection fails
+        return (255, 255, 255)
+
+    def has_transparency(self, image: Image.Image) -> bool:
+        """Check whether an RGBA image has any non-opaque pixel"""
+        if image.mode != 'RGBA':
+            return False
+        
+        # The answer is cached on the image so repeated checks cost nothing
+        cached = getattr(image, '_has_transparency', None)
+        if cached is None:
+            # Minimum alpha computed in C instead of iterating pixels in Python
+            min_alpha, max_alpha = image.getchannel('A').getextrema()
+            cached = image._has_transparency = min_alpha < 255
+        return cached
+    
+    def shared_background(self, backgrounds: dict, name: str, scope_sources: Callable[[str], Iterable[str]], open_source: Callable[[str], object], width: int, height: int) -> Optional[tuple]:
+        """Background shared by name's folder or batch under background_scope, or None to detect it per image
+        
+        backgrounds maps each scope ('' for the batch, otherwise a folder relative to the batch)
+        to its color, or None if it has no usable image. The color comes from the scope's
+        reference image, the first of scope_sources(scope) that opens without transparency,
+        so it doesn't depend on listing order or on which files a run skips.
+        """
+        if self.background_scope == 'image':
+            return None
+        scope = os.path.dirname(name) if self.background_scope == 'folder' else ''
+        if scope not in backgrounds:
+            backgrounds[scope] = self.reference_background(scope_sources(scope), open_source, width, height)
+        return backgrounds[scope]
+    
+    def reference_background(self, names: Iterable[str], open_source: Callable[[str], object], width: int, height: int) -> Optional[tuple]:
+        """Detect the background of the first of names that can be decoded and has no transparency"""
+        for name in names:
+            try:
+                source = open_source(name)
+            except Exception:
+                continue
+            try:
+                with Image.open(source) as image:
+                    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+                        # Transparent images are padded with black, they can't tell the backdrop
+                        continue
+                    # Corners survive a reduced-scale decode, so only decode what the canvas needs
+                    image.draft(None, (width, height))
+                    image.load()
+                    return self.get_background_color(image)
+            except Exception:
+                # Unreadable files fail in their own job
+                continue
+            finally:
+                if hasattr(source, 'close'):
+                    source.close()
+        return None
+    
+    def sorted_sources(self, folder_path: str, recursive: bool = False) -> Iterator[str]:
+        """Yield the supported images under folder_path, relative to it, in sorted path order"""
+        with os.scandir(folder_path) as entries:
+            # A subfolder sorts as 'name/', as its files' paths do
+            entries = sorted(entries, key=lambda entry: entry.name + '/' if entry.is_dir() else entry.name)
+        for entry in entries:
+            if entry.is_dir():
+                if recursive:
+                    for rel_path in self.sorted_sources(entry.path, True):
+                        yield os.path.join(entry.name, rel_path)
+            elif entry.name.lower().endswith(self.supported_formats):
+                yield entry.name
+    
+    def folder_scope_sources(self, folder_path: str, recursive: bool, scope: str) -> Iterator[str]:
+        """Candidate reference images of a background scope of folder_path, in sorted order"""
+        if self.background_scope == 'batch':
+            return self.sorted_sources(folder_path, recursive)
+        return (os.path.join(scope, name) for name in self.sorted_sources(os.path.join(folder_path, scope)))
+    
+    @staticmethod
+    def decoded_bytes(mode: str, size: Tuple[int, int]) -> int:
+        """Approximate bytes Pillow allocates for the pixels of an image of this mode and size"""
+        if mode in ('1', 'L', 'P'):
+            pixel_bytes = 1
+        elif mode.startswith('I;16'):
+            pixel_bytes = 2
+        else:
+            # Multi-band 8-bit modes are stored padded to 4 bytes per pixel, like I and F
+            pixel_bytes = 4
+        return size[0] * size[1] * pixel_bytes
+    
+    def draft_gap(self, image: Image.Image) -> Optional[float]:
+        """The reducing_gap to decode image with: the configured one, or the budget fallback if it won't fit in full"""
+        if self.reducing_gap:
+            return self.reducing_gap
+        if self.memory_budget_mb is not None and self.decoded_bytes(image.mode, image.size) > self.memory_budget_mb * 1024 * 1024:
+            return self.budget_reducing_gap
+        return None
+    
+    @staticmethod
+    def draft_request(image: Image.Image, scale: float, reducing_gap: float) -> Tuple[int, int]:
+        """Size to pass to draft() for image scaled by scale, reducing_gap times larger than the result"""
+        # A very wide or tall image would round its short side down to 0, which draft() divides by
+        return max(int(image.width * scale * reducing_gap), 1), max(int(image.height * scale * reducing_gap), 1)
+    
+    def decode_size(self, image: Image.Image, width: int, height: int, maintain_aspect: bool = True) -> Tuple[int, int]:
+        """Size image will decode at when resized to width x height, from its header alone"""
+        reducing_gap = self.draft_gap(image)
+        scale = min(width / image.width, height / image.height)
+        if image.format != 'JPEG' or not reducing_gap or not maintain_aspect or scale >= 1:
+            return image.size
+        
+        # Mirror the JPEG decoder's choice of DCT scale (1/1, 1/2, 1/4 or 1/8) for draft()
+        requested = self.draft_request(image, scale, reducing_gap)
+        factor = min(image.width // requested[0], image.height // requested[1])
+        # A request larger than the image (a mild downscale with a wide gap) decodes in full
+        reduction = next((s for s in (8, 4, 2, 1) if factor >= s), 1)
+        return -(-image.width // reduction), -(-image.height // reduction)
+    
+    def estimate_memory(self, source, width: int, height: int, maintain_aspect: bool = True, output_format: Optional[str] = None) -> int:
+        """Estimate the peak bytes needed to resize source (a path, encoded bytes or an open image) onto a width x height canvas
+        
+        Only the header is read, so this is cheap even for huge files. Animated and multi-page
+        sources count every frame when output_format keeps them all.
+        """
+        image = source if isinstance(source, Image.Image) else Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+        try:
+            decoded = self.decoded_bytes(image.mode, self.decode_size(image, width, height, maintain_aspect))
+            Image.init()
+            frames = getattr(image, 'n_frames', 1) if output_format and output_format.upper() in Image.SAVE_ALL else 1
+        finally:
+            if image is not source:
+                image.close()
+        canvas = self.decoded_bytes('RGB', (width, height))
+        if frames > 1:
+            # resize_frames holds every decoded frame and every canvas until the sequence is saved
+            return frames * (decoded + canvas) + canvas
+        # The decoded source, plus its scaled copy and the canvas it is pasted onto
+        return decoded + 2 * canvas
+    
+    def estimate_job_memory(self, method_name: str, args: tuple) -> int:
+        """Estimate the peak bytes of a BatchEngine job, or 0 if it can't be told from the header"""
+        try:
+            if method_name in ('resize_bytes', 'resize_or_copy_bytes', 'resize_zip_member'):
+                data, filename, width, height, maintain_aspect = args[:5]
+                target_format = args[7] if len(args) > 7 else None
+                output_format = self.path_format(self.output_name(filename, target_format))
+                # The encoded input and output are held alongside the pixels
+                return 2 * len(data) + self.estimate_memory(data, width, height, maintain_aspect, output_format)
+            if method_name == 'render_file':
+                input_path, outputs = args
+                renditions = [self.rendition_spec(rendition) for rendition, output_path in outputs]
+                largest = max(renditions, key=lambda rendition: rendition['width'] * rendition['height'])
+                canvases = sum(self.decoded_bytes('RGB', (rendition['width'], rendition['height'])) for rendition in renditions)
+                return self.estimate_memory(input_path, largest['width'], largest['height'], largest['maintain_aspect']) + canvases
+        except Exception:
+            # Unreadable files fail in the job itself, with a proper error
+            pass
+        return 0
+    
+    def memory_status(self, peak_rss: Optional[dict]) -> str:
+        """Status line reporting peak memory when a memory budget is in use"""
+        if self.memory_budget_mb is None or not peak_rss:
+            return ""
+        return f"\nPeak memory: {peak_rss['parent_mb']:.0f} MB (largest worker {peak_rss['workers_mb']:.0f} MB)"
+    
+    def fills_canvas(self, image: Image.Image, width: int, height: int) -> bool:
+        """Check whether image is exactly width x height with no background showing through"""
+        if image.size != (width, height):
+            return False
+        if image.mode == 'RGBA':
+            return not self.has_transparency(image)
+        # Alpha modes and paletted transparency would show the background
+        return image.mode in ('1', 'L', 'P', 'RGB') and 'transparency' not in image.info
+    
+    def can_pass_through(self, image: Image.Image, format: str, width: int, height: int) -> bool:
+        """Check whether pass_through lets image be copied unchanged as a width x height output in format"""
+        # Only the current frame is checked, later frames or pages may differ in size and alpha
+        return self.pass_through and image.format == format and getattr(image, 'n_frames', 1) == 1 and self.fills_canvas(image, width, height)
+    
+    def resize_image(self, image: Image.Image, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, is_png: bool = False, reducing_gap: Optional[float] = None, background: Optional[tuple] = None) -> Image.Image:
+        """Add smart background canvas padding to image to reach target dimensions
+        
+        A background color, if given, is used wherever one would otherwise be detected.
+        """
+        if self.fills_canvas(image, width, height):
+            # Nothing to scale or pad, so skip building and pasting onto a canvas
+            return image.convert('RGB')
+        
+        reducing_gap = reducing_gap or self.draft_gap(image)
+        
+        if reducing_gap and maintain_aspect:
+            # Ask the decoder for a reduced-resolution image before anything loads pixels,
+            # sized against the thumbnail the image will actually be scaled to.
+            # Only JPEG supports this; other formats ignore it and decode in full.
+            scale = min(width / image.width, height / image.height)
+            if scale < 1:
+                image.draft(None, self.draft_request(image, scale, reducing_gap))
+        
+        with self.timed('decode'):
+            image.load()
+        
+        with self.timed('background'):
+            # Special handling for PNG files
+            if image.format == 'PNG' or is_png:
+                # Check if PNG has transparency
+                has_transparency = self.has_transparency(image)
+            
+                # Choose background color based on user selection
+                if png_bg_option == "black":
+                    bg_color = (0, 0, 0)
+                elif png_bg_option == "white":
+                    bg_color = (255, 255, 255)
+                elif png_bg_option == "custom" and custom_color:
+                    bg_color = custom_color
+                elif png_bg_option == "auto":
+                    if has_transparency:
+                        # For transparent PNG, use black background by default
+                        bg_color = (0, 0, 0)
+                    else:
+                        # For non-transparent PNG, detect background color
+                        bg_color = background or self.get_background_color(image)
+                else:
+                    # Fallback to auto-detection
+                    bg_color = background or self.get_background_color(image)
+            else:
+                # For non-PNG images, use smart background detection
+                bg_color = background or self.get_background_color(image)
+        
+        # Calculate position to center the original image
+        orig_width, orig_height = image.size
+        
+        if maintain_aspect:
+            # Scale down image if it's larger than target canvas
+            if orig_width > width or orig_height > height:
+                with self.timed('resample'):
+                    if reducing_gap:
+                        image.thumbnail((width, height), Image.Resampling.LANCZOS, reducing_gap=reducing_gap)
+                    else:
+                        image.thumbnail((width, height), Image.Resampling.LANCZOS)
+                orig_width, orig_height = image.size
+        
+        # Calculate center position
+        x = (width - orig_width) // 2
+        y = (height - orig_height) // 2
+        
+        with self.timed('paste'):
+            # Create canvas with detected/selected background color
+            canvas = Image.new('RGB', (width, height), color=bg_color)
+            
+            # Handle different image modes for pasting
+            if image.mode == 'RGBA':
+                # For RGBA images (transparent PNG), paste with alpha mask
+                canvas.paste(image, (x, y), image)
+            else:
+                # Ensure image has RGB mode for pasting
+                if image.mode in ('LA', 'P'):
+                    image = image.convert('RGB')
+                # Paste original image onto smart background canvas
+                canvas.paste(image, (x, y))
+        
+        return canvas
+    
+    def open_image(self, image_path: str, cache: Optional['ImageCache'] = None) -> Image.Image:
+        """Open image_path, or copy its decoded pixels out of cache if the file hasn't changed"""
+        if cache is None:
+            return Image.open(image_path)
+        image = Image.open(image_path)
+        if getattr(image, 'n_frames', 1) > 1:
+            # The cache holds one decoded frame, animations and multi-page files need them all
+            return image
+        image.close()
+        # resize_image scales its argument in place, so never hand out the cached image itself
+        return self.cached_source(image_path, cache).copy()
+    
+    def cached_source(self, image_path: str, cache: 'ImageCache') -> Image.Image:
+        """Return the decoded image_path from cache, decoding it on a miss; callers must not modify it"""
+        def decode():
+            image = Image.open(image_path)
+            image.load()
+            return image
+        return cache.get_or_load(cache.file_key(image_path), decode)
+    
+    def process_single_image_file(self, image_path: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, cache: Optional['ImageCache'] = None, output_path: Optional[str] = None) -> str:
+        """Process a single image file and save it to output_path"""
+        if not output_path:
+            # Choosing where to save is up to the caller (the desktop app asks with a dialog)
+            raise ValueError("output_path is required")
+        try:
+            # Open and resize the image
+            image = self.open_image(image_path, cache)
+            
+            # Check if file is PNG based on extension
+            is_png = image_path.lower().endswith(('.png',))
+            
+            original_size = image.size
+            resized_image, save_options = self.resize_for_format(image, self.path_format(output_path), width, height, maintain_aspect, png_bg_option, custom_color, is_png)
+            new_size = resized_image.size
+            
+            self.save_image(resized_image, output_path, **save_options)
+            
+            return f"Original: {original_size[0]}x{original_size[1]} → Resized: {new_size[0]}x{new_size[1]}\nSaved to: {output_path}"
+            
+        except Exception as e:
+            raise Exception(f"Error processing image: {str(e)}")
+    
+    def resize_file(self, input_path: str, output_path: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None) -> str:
+        """Resize one image file and save it to output_path without any dialogs"""
+        image = Image.open(input_path)
+        
+        # Check if file is PNG based on extension
+        is_png = input_path.lower().endswith(('.png',))
+        
+        resized_image, save_options = self.resize_for_format(image, self.path_format(output_path), width, height, maintain_aspect, png_bg_option, custom_color, is_png)
+        self.save_image(resized_image, output_path, **save_options)
+        return output_path
+    
+    def resize_data(self, source, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, target_format: Optional[str] = None, background: Optional[tuple] = None) -> dict:
+        """Resize an encoded image given as bytes or a binary file object, without touching the filesystem
+        
+        Returns data (the encoded output), format (its Pillow format name), mime_type,
+        original_size, size, bytes_in, bytes_out and copied (True if pass_through returned
+        the source unchanged). The source format is kept unless target_format is given.
+        """
+        target_format = self.check_target_format(target_format)
+        name = getattr(source, 'name', 'image data')
+        data = bytes(source) if isinstance(source, (bytes, bytearray, memoryview)) else source.read()
+        image = self._open_bytes(data, name)
+        original_size = image.size
+        format = target_format.upper() if target_format else image.format
+        
+        if self.can_pass_through(image, format, width, height):
+            output, size, copied = data, original_size, True
+        else:
+            resized_image, save_options = self.resize_for_format(image, format, width, height, maintain_aspect, png_bg_option, custom_color, background=background)
+            buffer = io.BytesIO()
+            self.save_image(resized_image, buffer, format, **save_options)
+            output, size, copied = buffer.getvalue(), resized_image.size, False
+        
+        return {'data': output, 'format': format, 'mime_type': Image.MIME.get(format), 'original_size': original_size, 'size': size,
+                'bytes_in': len(data), 'bytes_out': len(output), 'copied': copied}
+    
+    def resize_bytes(self, data: bytes, filename: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, target_format: Optional[str] = None, background: Optional[tuple] = None) -> bytes:
+        """Resize an encoded image held in memory and return it encoded in target_format, or the format of filename"""
+        return self._resize_opened(self._open_bytes(data, filename), filename, width, height, maintain_aspect, png_bg_option, custom_color, target_format, background)
+    
+    def resize_or_copy_bytes(self, data: bytes, filename: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, target_format: Optional[str] = None, background: Optional[tuple] = None) -> Optional[bytes]:
+        """Like resize_bytes, but return None if pass_through is on and the source can be copied unchanged
+        
+        That is the case when it is a single frame that already fills the canvas exactly and is in the output format.
+        """
+        image = self._open_bytes(data, filename)
+        ext = os.path.splitext(self.output_name(filename, target_format))[1].lower()
+        if self.can_pass_through(image, Image.registered_extensions().get(ext), width, height):
+            return None
+        return self._resize_opened(image, filename, width, height, maintain_aspect, png_bg_option, custom_color, target_format, background)
+    
+    def resize_zip_member(self, data: bytes, filename: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, target_format: Optional[str] = None, background: Optional[tuple] = None) -> Optional[tuple]:
+        """Like resize_or_copy_bytes, but return the output ready for a zip entry as (payload, compress_type, crc, size)"""
+        output = self.resize_or_copy_bytes(data, filename, width, height, maintain_aspect, png_bg_option, custom_color, target_format, background)
+        if output is None:
+            return None
+        return self.zip_payload(output, self.output_name(filename, target_format))
+    
+    def zip_compress_type(self, arcname: str) -> int:
+        """ZIP_STORED for formats that are already compressed, otherwise ZIP_DEFLATED"""
+        return zipfile.ZIP_STORED if arcname.lower().endswith(self.stored_zip_extensions) else zipfile.ZIP_DEFLATED
+    
+    def zip_payload(self, data: bytes, arcname: str) -> tuple:
+        """Compress data for a zip entry named arcname and return (payload, compress_type, crc, size)
+        
+        Deflating here lets batch workers compress members in parallel; the archive
+        writer then only appends the raw deflate stream.
+        """
+        compress_type = self.zip_compress_type(arcname)
+        crc = zlib.crc32(data)
+        if compress_type == zipfile.ZIP_STORED:
+            return data, compress_type, crc, len(data)
+        with self.timed('compress'):
+            level = zlib.Z_DEFAULT_COMPRESSION if self.zip_compresslevel is None else self.zip_compresslevel
+            # Negative wbits: a raw deflate stream, without the zlib header zip entries don't use
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+            payload = compressor.compress(data) + compressor.flush()
+        return payload, compress_type, crc, len(data)
+    
+    def _open_bytes(self, data: bytes, filename: str) -> Image.Image:
+        try:
+            with self.timed('open'):
+                return Image.open(io.BytesIO(data))
+        except UnidentifiedImageError:
+            # Name the file rather than the in-memory buffer
+            raise UnidentifiedImageError(f"cannot identify image file {filename!r}")
+    
+    def _resize_opened(self, image: Image.Image, filename: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, target_format: Optional[str] = None, background: Optional[tuple] = None) -> bytes:
+        # Check if file is PNG based on extension
+        is_png = filename.lower().endswith(('.png',))
+        
+        # Pick the encoder from the (converted) extension, as saving to a path would.
+        # The canvas is RGB, so converting never has alpha left to lose.
+        format = self.path_format(self.output_name(filename, target_format))
+        resized_image, save_options = self.resize_for_format(image, format, width, height, maintain_aspect, png_bg_option, custom_color, is_png, background)
+        output = io.BytesIO()
+        self.save_image(resized_image, output, format, **save_options)
+        return output.getvalue()
+    
+    def resize_for_format(self, image: Image.Image, format: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, is_png: bool = False, background: Optional[tuple] = None) -> Tuple[Image.Image, dict]:
+        """Resize image for saving as format, returning the canvas and any extra save() options it needs
+        
+        Animated and multi-page images keep all their frames when format can store several;
+        otherwise only the first frame is used.
+        """
+        Image.init()
+        if getattr(image, 'n_frames', 1) > 1 and format.upper() in Image.SAVE_ALL:
+            frames, save_options = self.resize_frames(image, width, height, maintain_aspect, png_bg_option, custom_color, is_png, background)
+            return frames[0], save_options
+        return self.resize_image(image, width, height, maintain_aspect, png_bg_option, custom_color, is_png, background=background), {}
+    
+    def resize_frames(self, image: Image.Image, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, is_png: bool = False, background: Optional[tuple] = None) -> Tuple[List[Image.Image], dict]:
+        """Resize every frame of an animated or multi-page image, returning the canvases in order
+        and the save() options (save_all, append_images, duration, loop) that reassemble them"""
+        is_png = is_png or image.format == 'PNG'
+        loop = image.info.get('loop')
+        frames = []
+        durations = []
+        with self.timed('decode'):
+            # Frames can only be decoded one after another, each may build on the previous one
+            for index in range(image.n_frames):
+                image.seek(index)
+                frames.append(image.copy())
+                durations.append(image.info.get('duration'))
+        
+        # One background for the whole sequence, so the padding doesn't flicker between frames
+        background = background or self.get_background_color(frames[0])
+        
+        # Resampling and pasting release the GIL, so frames are resized side by side on threads
+        default_workers = 1 if _worker_resizer is not None else os.cpu_count() or 1
+        workers = min(self.frame_workers or default_workers, len(frames))
+        with self.timed('resample'), ThreadPoolExecutor(max_workers=workers) as executor:
+            canvases = list(executor.map(
+                lambda frame: self.resize_image(frame, width, height, maintain_aspect, png_bg_option, custom_color, is_png, background=background),
+                frames))
+        
+        save_options = {'save_all': True, 'append_images': canvases[1:]}
+        if any(durations):
+            save_options['duration'] = [duration or 0 for duration in durations]
+        if loop is not None:
+            save_options['loop'] = loop
+        return canvases, save_options
+    
+    def resize_renditions(self, image: Image.Image, renditions: List[dict], is_png: bool = False) -> List[Image.Image]:
+        """Render several canvases from one decoded image, returned in the order of renditions"""
+        renditions = [self.rendition_spec(rendition) for rendition in renditions]
+        
+        # Largest canvases first, so each smaller one can be scaled down from the previous result
+        order = sorted(range(len(renditions)), key=lambda i: renditions[i]['width'] * renditions[i]['height'], reverse=True)
+        
+        reducing_gap = self.draft_gap(image)
+        if reducing_gap and order:
+            # Decode only as much as the largest rendition needs
+            largest = renditions[order[0]]
+            scale = min(largest['width'] / image.width, largest['height'] / image.height)
+            if scale < 1 and all(rendition['maintain_aspect'] for rendition in renditions):
+                image.draft(None, self.draft_request(image, scale, reducing_gap))
+        with self.timed('decode'):
+            image.load()
+        
+        results = [None] * len(renditions)
+        previous = None
+        for i in order:
+            rendition = renditions[i]
+            source = image
+            
+            if rendition['maintain_aspect']:
+                # Reuse the previous (smaller than the original) scaled image when it is still
+                # at least as large as this rendition needs, instead of resampling the original
+                scale = min(rendition['width'] / image.width, rendition['height'] / image.height, 1)
+                needed = (int(image.width * scale), int(image.height * scale))
+                if previous is not None and previous.width >= needed[0] and previous.height >= needed[1]:
+                    source = previous
+                
+                with self.timed('resample'):
+                    scaled = source.copy()
+                    scaled.thumbnail((rendition['width'], rendition['height']), Image.Resampling.LANCZOS)
+                previous = scaled
+            else:
+                # Unscaled renditions are pasted at the original size
+                scaled = source.copy()
+            
+            # resize_image sees an image that already fits, so it only pads
+            results[i] = self.resize_image(scaled, rendition['width'], rendition['height'], rendition['maintain_aspect'],
+                                           rendition['png_bg_option'], rendition['custom_color'], is_png or image.format == 'PNG')
+        
+        return results
+    
+    def rendition_spec(self, rendition: dict) -> dict:
+        """Fill in the defaults for a rendition dict with name, width and height keys"""
+        missing = [key for key in ('name', 'width', 'height') if key not in rendition]
+        if missing:
+            raise ValueError(f"Rendition is missing {', '.join(missing)}")
+        return {'maintain_aspect': True, 'png_bg_option': 'auto', 'custom_color': None, **rendition}
+    
+    def render_file(self, input_path: str, outputs: List[Tuple[dict, str]]) -> List[str]:
+        """Decode input_path once and save every (rendition, output_path) pair"""
+        with self.timed('open'):
+            image = Image.open(input_path)
+        
+        # Check if file is PNG based on extension
+        is_png = input_path.lower().endswith(('.png',))
+        
+        renditions = [rendition for rendition, output_path in outputs]
+        for resized_image, (rendition, output_path) in zip(self.resize_renditions(image, renditions, is_png), outputs):
+            self.save_image(resized_image, output_path)
+        return [output_path for rendition, output_path in outputs]
+    
+    def process_folder(self, folder_path: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, workers: int = 1, max_in_flight: Optional[int] = None, recursive: bool = False, incremental: bool = False, progress_callback: Optional[Callable[[dict], None]] = None, cancel_event: Optional[threading.Event] = None, target_format: Optional[str] = None, largest_first: bool = False) -> Tuple[List[str], str]:
+        """Process all images in a folder, optionally on a pool of worker processes, and return every output written (resized or copied) in listing order"""
+        try:
+            result = self.batch_folder(folder_path, width, height, maintain_aspect, png_bg_option, custom_color, workers, max_in_flight, recursive, incremental, progress_callback, cancel_event, target_format, largest_first)
+        except ValueError as e:
+            return [], str(e)
+        return result['output_files'], self.folder_status(result)
+    
+    def folder_status(self, result: dict) -> str:
+        """Human-readable summary of a batch_folder result"""
+        processed_files = result['processed_files']
+        error_files = [f"{name}: {error}" for name, error in result['errors']]
+        
+        status = f"Processed {len(processed_files)} images successfully\nOutput folder: {result['output_dir']}"
+        if result['cancelled']:
+            status = f"Cancelled after {len(processed_files)} images\nOutput folder: {result['output_dir']}"
+        if result['skipped_files']:
+            status += f"\nSkipped {len(result['skipped_files'])} unchanged images"
+        if result['copied_files']:
+            status += f"\nCopied {len(result['copied_files'])} images already at the target size unchanged"
+        if error_files:
+            status += f"\nErrors with {len(error_files)} files: {'; '.join(error_files[:3])}"
+        status += self.memory_status(result['peak_rss'])
+        return status
+    
+    def batch_folder(self, folder_path: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, workers: int = 1, max_in_flight: Optional[int] = None, recursive: bool = False, incremental: bool = False, progress_callback: Optional[Callable[[dict], None]] = None, cancel_event: Optional[threading.Event] = None, target_format: Optional[str] = None, largest_first: bool = False) -> dict:
+        """Process all images in a folder and return output_dir, output_files (processed and copied), processed_files, skipped_files, copied_files, (file, error) errors, cancelled, stages, peak_rss and report (a RunReport if instrumented)"""
+        if not folder_path or not os.path.exists(folder_path):
+            raise ValueError("Invalid folder path")
+        folder_path = os.path.normpath(folder_path)
+        target_format = self.check_target_format(target_format)
+        
+        processed = {}
+        copied = {}
+        skipped_files = []
+        errors = []
+        
+        # Create output directory
+        output_dir = os.path.join(os.path.dirname(folder_path), f"resized_{os.path.basename(folder_path)}")
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # Incremental runs skip sources whose output was produced from identical
+        # content with identical parameters, tracked in a manifest in output_dir
+        manifest = ResizeManifest(output_dir) if incremental else None
+        folder_jobs = FolderJobs(self, folder_path, output_dir, width, height, maintain_aspect, png_bg_option, custom_color, target_format, recursive, manifest)
+        
+        # The total is unknown until the (lazy) listing of the folder finishes
+        progress = BatchProgress(progress_callback)
+        
+        def jobs():
+            for index, rel_path in self.numbered_sources(folder_path, recursive, progress, (width, height, maintain_aspect) if largest_first else None):
+                job = folder_jobs.job(index, rel_path)
+                if job is None:
+                    skipped_files.append(folder_jobs.output_path(rel_path))
+                    progress.report('skipped', rel_path)
+                    continue
+                yield job
+        
+        engine = BatchEngine(self, workers, max_in_flight)
+        pipeline = BatchPipeline(engine)
+        report = RunReport() if self.instrument else None
+        try:
+            for key, written, error, elapsed in pipeline.run('resize_or_copy_bytes', jobs(), folder_jobs.read, folder_jobs.write, cancel_event):
+                index, rel_path, output_path, bytes_in = key
+                folder_jobs.finish(key, error)
+                if error is None:
+                    bytes_out, was_copied = written
+                    status = 'copied' if was_copied else 'done'
+                    (copied if was_copied else processed)[index] = output_path
+                else:
+                    bytes_out, status = 0, 'failed'
+                    errors.append((rel_path, error))
+                progress.report(status, rel_path, bytes_in, bytes_out, elapsed, error)
+                if report is not None:
+                    report.add(rel_path, status, bytes_in, bytes_out, elapsed, pipeline.pop_stages(key), error)
+        finally:
+            # Keep whatever finished, even if the run is interrupted
+            folder_jobs.save()
+            if report is not None:
+                report.finish()
+        
+        # Report outputs in listing order regardless of completion order
+        processed_files = [processed[index] for index in sorted(processed)]
+        copied_files = [copied[index] for index in sorted(copied)]
+        outputs = {**processed, **copied}
+        output_files = [outputs[index] for index in sorted(outputs)]
+        
+        return {'output_dir': output_dir, 'output_files': output_files, 'processed_files': processed_files, 'skipped_files': skipped_files, 'copied_files': copied_files, 'errors': errors, 'cancelled': engine.cancelled, 'stages': pipeline.stats, 'peak_rss': peak_rss(), 'report': report}
+    
+    def iter_source_files(self, folder_path: str, recursive: bool = False, walkers: int = 4) -> Iterator[str]:
+        """Yield paths relative to folder_path for every file to consider, as they are found
+        
+        Recursive listings scan subfolders on several threads and are not sorted, so the
+        first files are available straight away even in trees with hundreds of thousands.
+        """
+        if not recursive:
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        yield entry.name
+            return
+        
+        found = queue.Queue(10000)
+        stop = threading.Event()
+        lock = threading.Lock()
+        pending = [0]
+        end = object()
+        
+        def put(item):
+            # Block while the consumer is behind, unless it has gone away
+            while not stop.is_set():
+                try:
+                    found.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+        
+        def scan(directory):
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if stop.is_set():
+                            return
+                        if entry.is_dir(follow_symlinks=False):
+                            submit(entry.path)
+                        elif entry.is_file():
+                            put(os.path.relpath(entry.path, folder_path))
+            except OSError as e:
+                # A folder that can't be listed fails the run only if it is the top one
+                if directory == folder_path:
+                    put(e)
+            finally:
+                with lock:
+                    pending[0] -= 1
+                    finished = pending[0] == 0
+                if finished:
+                    put(end)
+        
+        def submit(directory):
+            with lock:
+                pending[0] += 1
+            executor.submit(scan, directory)
+        
+        executor = ThreadPoolExecutor(max_workers=walkers)
+        try:
+            submit(folder_path)
+            while True:
+                item = found.get()
+                if item is end:
+                    return
+                if isinstance(item, OSError):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def numbered_sources(self, folder_path: str, recursive: bool, progress: 'BatchProgress', largest_first: Optional[Tuple[int, int, bool]] = None) -> Iterator[Tuple[int, str]]:
+        """Yield (index, rel_path) for the supported images in folder_path as they are found, giving progress the total once the listing ends
+        
+        With largest_first=(width, height, maintain_aspect) the folder is listed in full first and ordered by header cost.
+        """
+        sources = (rel_path for rel_path in self.iter_source_files(folder_path, recursive)
+                   if rel_path.lower().endswith(self.supported_formats))
+        if largest_first:
+            sources = list(sources)
+            progress.set_total(len(sources))
+            for index in self.order_largest_first(sources, lambda rel_path: open(os.path.join(folder_path, rel_path), 'rb'), *largest_first):
+                yield index, sources[index]
+            return
+        
+        count = 0
+        for count, rel_path in enumerate(sources, 1):
+            yield count - 1, rel_path
+        progress.set_total(count)
+    
+    def plan_entry(self, name: str, image_file, bytes_in: int, width: int, height: int, maintain_aspect: bool = True, target_format: Optional[str] = None) -> dict:
+        """Describe one image and its estimated cost from its header, without decoding pixel data
+        
+        The exception is an RGBA image already at the canvas size, whose alpha is read to tell
+        whether batch runs would copy it unchanged (see can_pass_through).
+        """
+        try:
+            image = Image.open(image_file)
+        except UnidentifiedImageError:
+            raise UnidentifiedImageError(f"cannot identify image file {os.path.basename(name)!r}")
+        try:
+            decoded = self.decode_size(image, width, height, maintain_aspect)
+            target = Image.registered_extensions()[self.target_formats[target_format]] if target_format else image.format
+            return {
+                'file': name,
+                'format': image.format,
+                'mode': image.mode,
+                'size': list(image.size),
+                'bytes': bytes_in,
+                'pixels': image.width * image.height,
+                'needs_downscale': maintain_aspect and (image.width > width or image.height > height),
+                # Batch runs would copy it unchanged rather than resize it
+                'matches_target': self.can_pass_through(image, target, width, height),
+                # Work grows with the pixels decoded and resampled plus the canvas encoded
+                'cost': decoded[0] * decoded[1] + width * height,
+                'estimated_memory': self.estimate_memory(image, width, height, maintain_aspect),
+            }
+        finally:
+            image.close()
+    
+    def plan_folder(self, folder_path: str, width: int, height: int, maintain_aspect: bool = True, recursive: bool = False, target_format: Optional[str] = None) -> dict:
+        """Plan resizing a folder from image headers alone, see summarise_plan"""
+        if not folder_path or not os.path.exists(folder_path):
+            raise ValueError("Invalid folder path")
+        folder_path = os.path.normpath(folder_path)
+        target_format = self.check_target_format(target_format)
+        
+        entries = []
+        errors = []
+        for rel_path in self.iter_source_files(folder_path, recursive):
+            if not rel_path.lower().endswith(self.supported_formats):
+                continue
+            input_path = os.path.join(folder_path, rel_path)
+            try:
+                entries.append(self.plan_entry(rel_path, input_path, os.path.getsize(input_path), width, height, maintain_aspect, target_format))
+            except Exception as e:
+                errors.append((rel_path, str(e)))
+        return self.summarise_plan(entries, errors)
+    
+    def plan_zip(self, zip_path: str, width: int, height: int, maintain_aspect: bool = True, target_format: Optional[str] = None) -> dict:
+        """Plan resizing a zip file from its central directory and image headers alone, see summarise_plan"""
+        target_format = self.check_target_format(target_format)
+        
+        entries = []
+        errors = []
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            for member in zip_ref.infolist():
+                if member.is_dir() or not member.filename.lower().endswith(self.supported_formats):
+                    continue
+                try:
+                    # Only the first few kilobytes of the member are inflated to parse the header
+                    with zip_ref.open(member) as f:
+                        entries.append(self.plan_entry(member.filename, f, member.file_size, width, height, maintain_aspect, target_format))
+                except Exception as e:
+                    errors.append((member.filename, str(e)))
+        return self.summarise_plan(entries, errors)
+    
+    def summarise_plan(self, entries: List[dict], errors: List[Tuple[str, str]]) -> dict:
+        """Build a plan: jobs largest cost first, unchanged images that pass_through would copy, (file, error) header errors and totals"""
+        jobs = sorted((entry for entry in entries if not entry['matches_target']), key=lambda entry: entry['cost'], reverse=True)
+        return {
+            'jobs': jobs,
+            'unchanged': [entry for entry in entries if entry['matches_target']],
+            'errors': errors,
+            'total_images': len(entries) + len(errors),
+            'total_pixels': sum(entry['pixels'] for entry in entries),
+            'needs_downscale': sum(1 for entry in jobs if entry['needs_downscale']),
+            'total_cost': sum(entry['cost'] for entry in jobs),
+            'max_estimated_memory': max((entry['estimated_memory'] for entry in jobs), default=0),
+        }
+    
+    def order_largest_first(self, names: List[str], open_source: Callable[[str], object], width: int, height: int, maintain_aspect: bool = True) -> List[int]:
+        """Order indexes into names by descending header cost, so big images don't start last and hold up the end of a batch"""
+        def cost(index):
+            try:
+                with open_source(names[index]) as f:
+                    return self.plan_entry(names[index], f, 0, width, height, maintain_aspect)['cost']
+            except Exception:
+                # Unreadable files fail quickly once processed
+                return 0
+        return sorted(range(len(names)), key=cost, reverse=True)
+    
+    def process_renditions(self, folder_path: str, renditions: List[dict], workers: int = 1, max_in_flight: Optional[int] = None, recursive: bool = False, progress_callback: Optional[Callable[[dict], None]] = None, cancel_event: Optional[threading.Event] = None, target_format: Optional[str] = None, largest_first: bool = False) -> Tuple[List[str], str]:
+        """Process all images in a folder into every rendition, decoding each source once"""
+        try:
+            result = self.batch_renditions(folder_path, renditions, workers, max_in_flight, recursive, progress_callback, cancel_event, target_format, largest_first)
+        except ValueError as e:
+            return [], str(e)
+        
+        processed_files = result['processed_files']
+        error_files = [f"{name}: {error}" for name, error in result['errors']]
+        
+        status = f"Processed {len(processed_files) // len(renditions)} images into {len(renditions)} renditions successfully\nOutput folder: {result['output_dir']}"
+        if result['cancelled']:
+            status = f"Cancelled after {len(processed_files) // len(renditions)} images\nOutput folder: {result['output_dir']}"
+        if error_files:
+            status += f"\nErrors with {len(error_files)} files: {'; '.join(error_files[:3])}"
+        status += self.memory_status(result['peak_rss'])
+        
+        return processed_files, status
+    
+    def batch_renditions(self, folder_path: str, renditions: List[dict], workers: int = 1, max_in_flight: Optional[int] = None, recursive: bool = False, progress_callback: Optional[Callable[[dict], None]] = None, cancel_event: Optional[threading.Event] = None, target_format: Optional[str] = None, largest_first: bool = False) -> dict:
+        """Render every image in a folder into resized_<folder>/<rendition name>/ and return output_dir, processed_files, (file, error) errors, cancelled, peak_rss and report (a RunReport if instrumented)"""
+        if not folder_path or not os.path.exists(folder_path):
+            raise ValueError("Invalid folder path")
+        if not renditions:
+            raise ValueError("No renditions requested")
+        folder_path = os.path.normpath(folder_path)
+        target_format = self.check_target_format(target_format)
+        renditions = [self.rendition_spec(rendition) for rendition in renditions]
+        
+        processed = {}
+        errors = []
+        
+        output_dir = os.path.join(os.path.dirname(folder_path), f"resized_{os.path.basename(folder_path)}")
+        os.makedirs(output_dir, exist_ok=True)
+        
+        progress = BatchProgress(progress_callback)
+        largest = max(renditions, key=lambda rendition: rendition['width'] * rendition['height'])
+        
+        def jobs():
+            for index, rel_path in self.numbered_sources(folder_path, recursive, progress, (largest['width'], largest['height'], largest['maintain_aspect']) if largest_first else None):
+                outputs = []
+                for rendition in renditions:
+                    output_path = os.path.join(output_dir, rendition['name'], self.output_name(rel_path, target_format))
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    outputs.append((rendition, output_path))
+                input_path = os.path.join(folder_path, rel_path)
+                yield (index, rel_path, os.path.getsize(input_path)), (input_path, outputs)
+        
+        engine = BatchEngine(self, workers, max_in_flight)
+        report = RunReport() if self.instrument else None
+        for key, output_paths, error, elapsed in engine.run('render_file', jobs(), cancel_event):
+            index, rel_path, bytes_in = key
+            if error is None:
+                status, bytes_out = 'done', sum(os.path.getsize(path) for path in output_paths)
+                processed[index] = output_paths
+            else:
+                status, bytes_out = 'failed', 0
+                errors.append((rel_path, error))
+            progress.report(status, rel_path, bytes_in, bytes_out, elapsed, error)
+            if report is not None:
+                report.add(rel_path, status, bytes_in, bytes_out, elapsed, engine.pop_stages(key), error)
+        if report is not None:
+            report.finish()
+        
+        # One entry per output file, grouped by source in listing order
+        processed_files = [output_path for index in sorted(processed) for output_path in processed[index]]
+        
+        return {'output_dir': output_dir, 'processed_files': processed_files, 'errors': errors, 'cancelled': engine.cancelled, 'peak_rss': peak_rss(), 'report': report}
+    
+    def resize_params(self, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, target_format: Optional[str] = None) -> dict:
+        """Describe everything that affects the resized output, for manifest comparisons"""
+        return {
+            'width': width,
+            'height': height,
+            'maintain_aspect': maintain_aspect,
+            'png_bg_option': png_bg_option,
+            'custom_color': list(custom_color) if custom_color else None,
+            'background_estimator': self.background_estimator,
+            'reducing_gap': self.reducing_gap,
+            'encoder_profile': self.encoder_profile,
+            'target_format': target_format,
+            'pass_through': self.pass_through,
+            'background_scope': self.background_scope,
+        }
+    
+    def process_zip_file(self, zip_path: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, workers: int = 1, max_in_flight: Optional[int] = None, progress_callback: Optional[Callable[[dict], None]] = None, cancel_event: Optional[threading.Event] = None, target_format: Optional[str] = None, largest_first: bool = False) -> Tuple[str, str]:
+        """Process images from a zip file and return a new zip with resized images"""
+        try:
+            result = self.batch_zip(zip_path, width, height, maintain_aspect, png_bg_option, custom_color, workers, max_in_flight, progress_callback, cancel_event, target_format, largest_first)
+        except Exception as e:
+            return None, f"Error processing zip file: {str(e)}"
+        
+        if result['cancelled']:
+            # A partial archive is not a useful result
+            os.remove(result['output_zip'])
+            return None, f"Cancelled after {result['processed_count']} images"
+        
+        error_files = [f"{os.path.basename(name)}: {error}" for name, error in result['errors']]
+        
+        status = f"Processed {result['processed_count']} images successfully"
+        if result['copied_count']:
+            status += f"\nCopied {result['copied_count']} images already at the target size unchanged"
+        if error_files:
+            status += f"\nErrors with {len(error_files)} files: {'; '.join(error_files[:3])}"
+        status += self.memory_status(result['peak_rss'])
+        
+        return result['output_zip'], status
+    
+    def batch_zip(self, zip_path: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, workers: int = 1, max_in_flight: Optional[int] = None, progress_callback: Optional[Callable[[dict], None]] = None, cancel_event: Optional[threading.Event] = None, target_format: Optional[str] = None, largest_first: bool = False) -> dict:
+        """Stream images from a zip file into a new temporary zip and return output_zip, processed_count, copied_count, (member, error) errors, cancelled, stages, peak_rss and report (a RunReport if instrumented)
+        
+        Members keep their source order in the output, except with largest_first, where they are
+        appended as they finish: keeping the order would hold back nearly the whole archive.
+        """
+        target_format = self.check_target_format(target_format)
+        processed_count = 0
+        copied_count = 0
+        errors = []
+        
+        output_zip_path = tempfile.mktemp(suffix='.zip')
+        try:
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref, \
+                    zipfile.ZipFile(output_zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=self.zip_compresslevel) as zip_out:
+                
+                members = [member for member in zip_ref.infolist()
+                           if not member.is_dir() and member.filename.lower().endswith(self.supported_formats)]
+                progress = BatchProgress(progress_callback, len(members))
+                if largest_first:
+                    names = [member.filename for member in members]
+                    members = [members[index] for index in self.order_largest_first(names, zip_ref.open, width, height, maintain_aspect)]
+                
+                # Converting can map several members (photo.png, photo.jpg) onto one name
+                output_owners = {}
+                # Backgrounds detected once per folder or batch, filled in by the reader thread
+                backgrounds = {}
+                member_names = [member.filename for member in members]
+                
+                def scope_sources(scope):
+                    if self.background_scope == 'batch':
+                        return sorted(member_names)
+                    return sorted(name for name in member_names if os.path.dirname(name) == scope)
+                
+                def jobs():
+                    for member in members:
+                        # Same member name as the original, without _resized suffix
+                        arcname = self.output_name(member.filename, target_format)
+                        owner = output_owners.setdefault(arcname, member.filename)
+                        clash = owner if owner != member.filename else None
+                        yield (member.filename, arcname, member.file_size), (member, clash)
+                
+                def read(source):
+                    member, clash = source
+                    if clash:
+                        raise ValueError(f"output name already used by {clash}")
+                    # Members are read ahead by the pipeline, never more than its queues hold
+                    data = zip_ref.read(member)
+                    background = self.shared_background(backgrounds, member.filename, scope_sources, zip_ref.open, width, height)
+                    return (data, os.path.basename(member.filename), width, height, maintain_aspect, png_bg_option, custom_color, target_format, background)
+                
+                def write(key, entry):
+                    if entry is None:
+                        # Pass-through: stream the original member into the new archive
+                        zinfo = zipfile.ZipInfo(key[1], date_time=time.localtime()[:6])
+                        zinfo.external_attr = 0o600 << 16
+                        zinfo.compress_type = self.zip_compress_type(key[1])
+                        with zip_ref.open(key[0]) as source, zip_out.open(zinfo, 'w') as target:
+                            shutil.copyfileobj(source, target)
+                        return key[2], True
+                    # Workers already compressed the member, appending it is a plain write
+                    payload, compress_type, crc, size = entry
+                    write_zip_entry(zip_out, key[1], payload, compress_type, crc, size)
+                    return size, False
+                
+                engine = BatchEngine(self, workers, max_in_flight)
+                pipeline = BatchPipeline(engine)
+                report = RunReport() if self.instrument else None
+                for key, written, error, elapsed in pipeline.run('resize_zip_member', jobs(), read, write, cancel_event, ordered=not largest_first):
+                    arcname, output_name, bytes_in = key
+                    if error is None:
+                        bytes_out, was_copied = written
+                        if was_copied:
+                            status = 'copied'
+                            copied_count += 1
+                        else:
+                            status = 'done'
+                            processed_count += 1
+                    else:
+                        bytes_out, status = 0, 'failed'
+                        errors.append((arcname, error))
+                    progress.report(status, arcname, bytes_in, bytes_out, elapsed, error)
+                    if report is not None:
+                        report.add(arcname, status, bytes_in, bytes_out, elapsed, pipeline.pop_stages(key), error)
+                if report is not None:
+                    report.finish()
+        except Exception:
+            # Don't leave a half-written archive behind
+            if os.path.exists(output_zip_path):
+                os.remove(output_zip_path)
+            raise
+        
+        return {'output_zip': output_zip_path, 'processed_count': processed_count, 'copied_count': copied_count, 'errors': errors, 'cancelled': engine.cancelled, 'stages': pipeline.stats, 'peak_rss': peak_rss(), 'report': report}
+
+
+# Per-process ImageResizer used by BatchEngine worker processes
+_worker_resizer = None
+
+
+def _init_worker(resizer: ImageResizer):
+    global _worker_resizer
+    _worker_resizer = resizer
+    # Ctrl+C is handled by the parent, which cancels the batch cleanly
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+# Stage seconds of the job running on each thread, while it is instrumented
+_job_stages = threading.local()
+
+# Per-process profiler, shared by every job the process runs
+_profiler = None
+
+
+@contextmanager
+def _stage_timer(stages: dict, stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - start
+
+
+def _run_job(method: Callable, args: tuple) -> tuple:
+    """Run one job and return (result, error, elapsed seconds, stage seconds or None) instead of raising"""
+    global _profiler
+    resizer = method.__self__
+    stages = _job_stages.stages = {} if resizer.instrument else None
+    if resizer.profile_dir and _profiler is None:
+        _profiler = cProfile.Profile()
+    profiler = _profiler if resizer.profile_dir else None
+    if profiler is not None:
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        return method(*args), None, time.perf_counter() - start, stages
+    except Exception as e:
+        return None, str(e), time.perf_counter() - start, stages
+    finally:
+        _job_stages.stages = None
+        if profiler is not None:
+            profiler.disable()
+            # Rewritten after every job, as pool workers get no chance to save on exit
+            os.makedirs(resizer.profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(resizer.profile_dir, f"resize_{os.getpid()}.prof"))
+
+
+def _run_worker_job(method_name: str, args: tuple) -> tuple:
+    return _run_job(getattr(_worker_resizer, method_name), args)
+
+
+def peak_rss() -> Optional[dict]:
+    """Peak resident memory in MB of this process and of its largest finished child process, None where unsupported"""
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return None
+    # ru_maxrss is reported in kilobytes on Linux but in bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'parent_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / (1024 * 1024),
+        'workers_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / (1024 * 1024),
+    }
+
+
+# ZipFile attributes write_zip_entry uses to append precompressed data
+_ZIP_INTERNALS = ('fp', 'start_dir', '_writing', '_writecheck', '_didModify', 'filelist', 'NameToInfo')
+
+
+def write_zip_entry(zip_out: zipfile.ZipFile, arcname: str, payload: bytes, compress_type: int, crc: int, size: int):
+    """Append an entry whose data is already compressed with compress_type, as returned by ImageResizer.zip_payload
+    
+    zipfile has no public way to add precompressed data, so this writes the local header
+    and data the way ZipFile.open(..., 'w') does; close() writes the central directory.
+    That relies on ZipFile internals, checked against CPython 3.8 to 3.13 (round trips of
+    stored and deflated entries mixed with regular writes pass testzip() and read back).
+    Any other zipfile falls back to writestr, compressing the data a second time.
+    """
+    zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+    zinfo.external_attr = 0o600 << 16
+    zinfo.compress_type = compress_type
+    zinfo.CRC = crc
+    zinfo.file_size = size
+    zinfo.compress_size = len(payload)
+    if not all(hasattr(zip_out, name) for name in _ZIP_INTERNALS):
+        zip_out.writestr(zinfo, payload if compress_type == zipfile.ZIP_STORED else zlib.decompress(payload, -15))
+        return
+    fp, start_dir = zip_out.fp, zip_out.start_dir
+    if zip_out._writing:
+        raise ValueError("Can't write to the zip file while another write handle is open on it")
+    fp.seek(start_dir)
+    zinfo.header_offset = fp.tell()
+    zip_out._writecheck(zinfo)
+    zip_out._didModify = True
+    fp.write(zinfo.FileHeader(size > zipfile.ZIP64_LIMIT or len(payload) > zipfile.ZIP64_LIMIT))
+    fp.write(payload)
+    zip_out.start_dir = fp.tell()
+    zip_out.filelist.append(zinfo)
+    zip_out.NameToInfo[zinfo.filename] = zinfo
+
+
+class AsyncImageResizer:
+    """Resize images from asyncio code without blocking the event loop
+    
+    Every call runs ImageResizer.resize_data on one executor shared by all callers, and
+    at most max_concurrency resizes are submitted at a time; the rest wait in the event
+    loop, where they can still be cancelled. Pillow releases the GIL while decoding,
+    resampling and encoding, so the default thread pool resizes in parallel without
+    copying image data to other processes.
+    """
+    
+    def __init__(self, resizer: Optional[ImageResizer] = None, max_concurrency: Optional[int] = None, executor=None):
+        self.resizer = resizer or ImageResizer()
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        if self.max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self._own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(self.max_concurrency, thread_name_prefix='resize')
+        # Created on first use, inside the running event loop
+        self._semaphore = None
+    
+    async def resize(self, source, width: int, height: int, **options) -> dict:
+        """Resize bytes or a binary file object; options and the result are those of ImageResizer.resize_data"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(self.resizer.resize_data, source, width, height, **options))
+    
+    def close(self):
+        """Shut down the executor if this wrapper created it"""
+        if self._own_executor:
+            self.executor.shutdown()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        # Waiting for the executor to wind down must not block the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+class BatchProgress:
+    """Turn per-file results of a batch run into progress events for a callback"""
+    
+    def __init__(self, callback: Optional[Callable[[dict], None]], total: Optional[int] = None):
+        self.callback = callback
+        self.total = total
+        self.completed = 0
+        self.start = time.perf_counter()
+        # Files can be reported from pipeline stage threads as well as the caller's
+        self.lock = threading.Lock()
+    
+    def set_total(self, total: int):
+        """Set the total once the number of files is known"""
+        with self.lock:
+            self.total = total
+    
+    def report(self, status: str, file: str, bytes_in: int = 0, bytes_out: int = 0, elapsed: Optional[float] = None, error: Optional[str] = None):
+        """Count one finished file ('done', 'copied', 'failed' or 'skipped') and send its event"""
+        with self.lock:
+            self.completed += 1
+            completed = self.completed
+            total = self.total
+        if self.callback is None:
+            return
+        
+        run_elapsed = time.perf_counter() - self.start
+        rate = completed / run_elapsed if run_elapsed > 0 else 0.0
+        eta = None
+        if total is not None and rate > 0:
+            eta = max(total - completed, 0) / rate
+        
+        self.callback({
+            'status': status,
+            'file': file,
+            'error': error,
+            'bytes_in': bytes_in,
+            'bytes_out': bytes_out,
+            'elapsed': elapsed,
+            'completed': completed,
+            'total': total,
+            'run_elapsed': run_elapsed,
+            'images_per_second': rate,
+            'eta_seconds': eta,
+        })
+
+
+class ResizeManifest:
+    """Record of source files already resized into an output directory"""
+    
+    filename = '.resize_manifest.json'
+    
+    def __init__(self, output_dir: str):
+        self.path = os.path.join(output_dir, self.filename)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.entries = manifest.get('entries', {})
+            self.backgrounds = manifest.get('backgrounds', {})
+        except (OSError, ValueError):
+            # Missing or unreadable manifest: everything gets processed
+            self.entries = {}
+            self.backgrounds = {}
+    
+    @staticmethod
+    def file_hash(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def check(self, rel_path: str, input_path: str, output_path: str, params: dict) -> Optional[dict]:
+        """Return None if output_path is still valid for input_path, otherwise the entry to record once it is rebuilt"""
+        stat = os.stat(input_path)
+        entry = self.entries.get(rel_path)
+        
+        if entry and entry['params'] == params and os.path.exists(output_path):
+            if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                return None
+            # Touched but possibly identical: only the content hash can tell
+            if entry['size'] == stat.st_size:
+                sha256 = self.file_hash(input_path)
+                if entry['sha256'] == sha256:
+                    entry['mtime'] = stat.st_mtime
+                    return None
+                return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': sha256, 'params': params}
+        
+        return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': self.file_hash(input_path), 'params': params}
+    
+    def record(self, rel_path: str, entry: dict):
+        self.entries[rel_path] = entry
+    
+    def shared_backgrounds(self, params: dict) -> dict:
+        """Backgrounds by scope that earlier runs with the same params padded with"""
+        if self.backgrounds.get('params') != params:
+            return {}
+        return {scope: tuple(color) if color else None for scope, color in self.backgrounds.get('colors', {}).items()}
+    
+    def record_backgrounds(self, params: dict, backgrounds: dict):
+        if backgrounds:
+            self.backgrounds = {'params': params, 'colors': {scope: list(color) if color else None for scope, color in backgrounds.items()}}
+    
+    def save(self):
+        # Write then rename so an interrupted save never leaves a corrupt manifest
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'entries': self.entries, 'backgrounds': self.backgrounds}, f)
+        os.replace(temp_path, self.path)
+
+
+class ImageCache:
+    """Least-recently-used cache of decoded images, bounded by their total size in bytes"""
+    
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # Shared between the UI thread and processing threads
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def file_key(path: str, variant: str = 'source') -> tuple:
+        """Key for a rendering of a file, which stops matching once the file is modified"""
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime, stat.st_size, variant)
+    
+    def get(self, key: tuple) -> Optional[Image.Image]:
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+    
+    def put(self, key: tuple, image: Image.Image):
+        cost = ImageResizer.decoded_bytes(image.mode, image.size)
+        if cost > self.max_bytes:
+            # Caching it would evict everything else for a single image
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (image, cost)
+            self.size += cost
+            while self.size > self.max_bytes:
+                evicted_key, (evicted, evicted_cost) = self.entries.popitem(last=False)
+                self.size -= evicted_cost
+    
+    def get_or_load(self, key: tuple, load: Callable[[], Image.Image]) -> Image.Image:
+        image = self.get(key)
+        if image is None:
+            image = load()
+            self.put(key, image)
+        return image
+    
+    def stats(self) -> dict:
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.size, 'max_bytes': self.max_bytes}
+
+
+class RunReport:
+    """Per-file, per-stage timings of an instrumented batch run"""
+    
+    stages = ('read', 'open', 'decode', 'background', 'resample', 'paste', 'encode', 'compress', 'write')
+    
+    def __init__(self):
+        self.files = []
+        self.start = time.perf_counter()
+        self.wall_seconds = None
+    
+    def add(self, file: str, status: str, bytes_in: int = 0, bytes_out: int = 0, elapsed: Optional[float] = None, stages: Optional[dict] = None, error: Optional[str] = None):
+        stages = dict(stages or {})
+        self.files.append({
+            'file': file,
+            'status': status,
+            'error': error,
+            'bytes_in': bytes_in,
+            'bytes_out': bytes_out,
+            # Worker time plus the parent's reading and writing of the file
+            'total_seconds': (elapsed or 0.0) + stages.get('read', 0.0) + stages.get('write', 0.0),
+            'stages': stages,
+        })
+    
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self.start
+    
+    def slowest(self, count: int = 10) -> List[dict]:
+        return sorted(self.files, key=lambda record: record['total_seconds'], reverse=True)[:count]
+    
+    def summary(self, slowest: int = 10) -> dict:
+        return {
+            'files': len(self.files),
+            'failed': sum(1 for record in self.files if record['status'] == 'failed'),
+            'wall_seconds': self.wall_seconds,
+            'bytes_in': sum(record['bytes_in'] for record in self.files),
+            'bytes_out': sum(record['bytes_out'] for record in self.files),
+            'stage_seconds': {stage: sum(record['stages'].get(stage, 0.0) for record in self.files) for stage in self.stages},
+            'slowest': self.slowest(slowest),
+        }
+    
+    def write_json(self, path: str, slowest: int = 10):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'summary': self.summary(slowest), 'files': self.files}, f, indent=2)
+    
+    def write_csv(self, path: str):
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['file', 'status', 'bytes_in', 'bytes_out', 'total_seconds'] + [f"{stage}_seconds" for stage in self.stages] + ['error'])
+            for record in self.files:
+                writer.writerow([record['file'], record['status'], record['bytes_in'], record['bytes_out'], f"{record['total_seconds']:.6f}"]
+                                + [f"{record['stages'][stage]:.6f}" if stage in record['stages'] else '' for stage in self.stages]
+                                + [record['error'] or ''])
+    
+    def write(self, path: str, slowest: int = 10):
+        """Write the report as CSV if path ends in .csv, otherwise as JSON"""
+        if path.lower().endswith('.csv'):
+            self.write_csv(path)
+        else:
+            self.write_json(path, slowest)
+
+
+class BatchEngine:
+    """Run ImageResizer jobs inline or on a bounded pool of worker processes"""
+    
+    def __init__(self, resizer: ImageResizer, workers: int = 1, max_in_flight: Optional[int] = None):
+        self.resizer = resizer
+        # 0 or None means one worker per CPU core
+        self.workers = workers if workers else (os.cpu_count() or 1)
+        # Keep a couple of jobs queued per worker so no core waits on the parent,
+        # without submitting (and holding results for) the whole batch at once
+        self.max_in_flight = max(max_in_flight or self.workers * 2, 1)
+        # Estimated decoded bytes allowed in flight at once, from the resizer's budget
+        self.memory_budget = resizer.memory_budget_mb * 1024 * 1024 if resizer.memory_budget_mb is not None else None
+        self.cancelled = False
+        # Stage seconds of finished jobs by key, when the resizer is instrumented
+        self.job_stages = {}
+    
+    def pop_stages(self, key) -> dict:
+        """Take the stage seconds recorded for a finished job (empty unless instrumented)"""
+        return self.job_stages.pop(key, None) or {}
+    
+    def fits(self, memory: int, in_flight_memory: int, in_flight: int) -> bool:
+        """Check whether a job estimated at memory bytes may start next to in_flight jobs estimated at in_flight_memory"""
+        # A job over budget on its own still runs, once nothing else does
+        return self.memory_budget is None or not in_flight or in_flight_memory + memory <= self.memory_budget
+    
+    def _finished(self, key, result, error, elapsed, stages) -> tuple:
+        if stages is not None:
+            self.job_stages[key] = stages
+        return key, result, error, elapsed
+    
+    def run(self, method_name: str, jobs: Iterable[Tuple[object, tuple]], cancel_event: Optional[threading.Event] = None, ordered: bool = False) -> Iterator[Tuple[object, object, Optional[str], Optional[float]]]:
+        """Call resizer.<method_name>(*args) for each (key, args) job and yield (key, result, error, elapsed) as jobs finish,
+        or in the order of jobs if ordered
+        
+        Once cancel_event is set no further jobs start; jobs already running still report their result.
+        With a memory budget, jobs are only submitted while the estimated memory of the jobs in flight
+        fits; a job over budget on its own waits for the pool to drain and then runs alone. When ordered,
+        a finished job keeps its place in flight until every earlier one has been yielded, so a slow job
+        holds back at most max_in_flight results.
+        """
+        self.cancelled = False
+        
+        if self.workers <= 1:
+            method = getattr(self.resizer, method_name)
+            for key, args in jobs:
+                if cancel_event is not None and cancel_event.is_set():
+                    self.cancelled = True
+                    return
+                yield self._finished(key, *_run_job(method, args))
+            return
+        
+        jobs = iter(jobs)
+        pending = {}
+        exhausted = False
+        # The next job, held back while it doesn't fit in the memory budget
+        held = None
+        in_flight_memory = 0
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.resizer,)) as executor:
+            while True:
+                if cancel_event is not None and cancel_event.is_set() and not self.cancelled:
+                    # Stop feeding the pool and drop jobs that haven't started yet
+                    self.cancelled = True
+                    exhausted = True
+                    for future in list(pending):
+                        if future.cancel():
+                            in_flight_memory -= pending.pop(future)[1]
+                
+                # Top up the pool without exceeding the in-flight or memory bounds
+                while not exhausted and len(pending) < self.max_in_flight:
+                    if held is None:
+                        try:
+                            key, args = next(jobs)
+                        except StopIteration:
+                            exhausted = True
+                            break
+                        memory = self.resizer.estimate_job_memory(method_name, args) if self.memory_budget is not None else 0
+                        held = (key, args, memory)
+                    key, args, memory = held
+                    if not self.fits(memory, in_flight_memory, len(pending)):
+                        break
+                    pending[executor.submit(_run_worker_job, method_name, args)] = (key, memory)
+                    in_flight_memory += memory
+                    held = None
+                
+                if not pending:
+                    break
+                
+                # Wake up periodically so a cancellation is noticed while jobs run
+                if ordered:
+                    wait([next(iter(pending))], timeout=0.2)
+                    done = list(itertools.takewhile(lambda future: future.done(), pending))
+                else:
+                    done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, memory = pending.pop(future)
+                    in_flight_memory -= memory
+                    try:
+                        yield self._finished(key, *future.result())
+                    except Exception as e:
+                        # The worker process itself failed (e.g. it was killed)
+                        yield key, None, str(e), None
+
+
+class BatchPipeline:
+    """Overlap reading, resizing and writing by running each stage concurrently
+    
+    A reader thread prefetches job inputs, the BatchEngine resizes them and a writer
+    thread stores the results. The queues between the stages are bounded, so a stage
+    that runs ahead blocks instead of piling up images in memory.
+    """
+    
+    _END = object()
+    
+    def __init__(self, engine: BatchEngine, queue_size: Optional[int] = None):
+        self.engine = engine
+        self.queue_size = queue_size or engine.max_in_flight
+        self.stats = {}
+        # Per-job read and write seconds by key, when the resizer is instrumented
+        self.io_stages = {}
+    
+    def pop_stages(self, key) -> dict:
+        """Take the read, compute and write stage seconds recorded for a finished job (empty unless instrumented)"""
+        stages = self.engine.pop_stages(key)
+        stages.update(self.io_stages.pop(key, {}))
+        return stages
+    
+    def run(self, method_name: str, jobs: Iterable[Tuple[object, object]], read: Callable, write: Callable, cancel_event: Optional[threading.Event] = None, ordered: bool = False) -> Iterator[Tuple[object, object, Optional[str], Optional[float]]]:
+        """For each (key, source) job run read(source) -> args, resizer.<method_name>(*args) -> result and
+        write(key, result) -> value, yielding (key, value, error, elapsed) as jobs finish
+        
+        If ordered, results are written in the order of jobs (see BatchEngine.run).
+        Per-stage busy time and utilisation are left in self.stats when the run ends.
+        """
+        read_queue = queue.Queue(self.queue_size)
+        write_queue = queue.Queue(self.queue_size)
+        done_queue = queue.Queue()
+        stop = threading.Event()
+        busy = {'read': 0.0, 'compute': 0.0, 'write': 0.0, 'starved': 0.0}
+        reader_errors = []
+        instrument = self.engine.resizer.instrument
+        start = time.perf_counter()
+        
+        def put(target, item):
+            # Block while the next stage is behind, unless the run has been abandoned
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        
+        def reader():
+            try:
+                for key, source in jobs:
+                    if cancel_event is not None and cancel_event.is_set():
+                        break
+                    began = time.perf_counter()
+                    try:
+                        item = (key, read(source), None)
+                    except Exception as e:
+                        item = (key, None, str(e))
+                    busy['read'] += time.perf_counter() - began
+                    if instrument:
+                        self.io_stages[key] = {'read': time.perf_counter() - began}
+                    if not put(read_queue, item):
+                        return
+            except Exception as e:
+                # A failure to list jobs fails the whole run, in the caller's thread
+                reader_errors.append(e)
+            put(read_queue, self._END)
+        
+        def writer():
+            while not stop.is_set():
+                try:
+                    item = write_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is self._END:
+                    return
+                key, result, error, elapsed = item
+                began = time.perf_counter()
+                try:
+                    result = write(key, result)
+                except Exception as e:
+                    result, error = None, str(e)
+                busy['write'] += time.perf_counter() - began
+                if instrument:
+                    self.io_stages.setdefault(key, {})['write'] = time.perf_counter() - began
+                done_queue.put((key, result, error, elapsed))
+        
+        def feed():
+            while True:
+                began = time.perf_counter()
+                item = read_queue.get()
+                busy['starved'] += time.perf_counter() - began
+                if item is self._END:
+                    return
+                key, args, error = item
+                if error is not None:
+                    done_queue.put((key, None, error, None))
+                else:
+                    yield key, args
+        
+        def drain():
+            while True:
+                try:
+                    yield done_queue.get_nowait()
+                except queue.Empty:
+                    return
+        
+        reader_thread = threading.Thread(target=reader, daemon=True)
+        writer_thread = threading.Thread(target=writer, daemon=True)
+        reader_thread.start()
+        writer_thread.start()
+        try:
+            for key, result, error, elapsed in self.engine.run(method_name, feed(), cancel_event, ordered):
+                busy['compute'] += elapsed or 0.0
+                if error is None:
+                    put(write_queue, (key, result, None, elapsed))
+                else:
+                    done_queue.put((key, None, error, elapsed))
+                yield from drain()
+            
+            put(write_queue, self._END)
+            writer_thread.join()
+            yield from drain()
+            if reader_errors:
+                raise reader_errors[0]
+        finally:
+            stop.set()
+            self.stats = self._stage_stats(busy, time.perf_counter() - start)
+    
+    def _stage_stats(self, busy: dict, wall: float) -> dict:
+        """Summarise how busy each stage was over the run, and which one limited throughput"""
+        wall = max(wall, 1e-9)
+        stages = {
+            'read': {'busy_seconds': busy['read'], 'utilisation': busy['read'] / wall},
+            'compute': {'busy_seconds': busy['compute'], 'workers': self.engine.workers,
+                        'utilisation': busy['compute'] / (wall * self.engine.workers)},
+            'write': {'busy_seconds': busy['write'], 'utilisation': busy['write'] / wall},
+        }
+        return {
+            'wall_seconds': wall,
+            'stages': stages,
+            # Time the compute stage spent waiting for the reader to deliver input
+            'compute_starved_seconds': busy['starved'],
+            'bottleneck': max(stages, key=lambda stage: stages[stage]['utilisation']),
+        }
+
+
+class FolderJobs:
+    """Read and write steps of resizing a folder into output_dir, shared by batch_folder and FolderWatcher
+    
+    Sources converted onto one output name (photo.png and photo.jpg to photo.webp) fail after
+    the first instead of overwriting it. With a manifest, sources whose output is up to date
+    are skipped and finished outputs are recorded.
+    """
+    
+    def __init__(self, resizer: ImageResizer, folder_path: str, output_dir: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, target_format: Optional[str] = None, recursive: bool = False, manifest: Optional['ResizeManifest'] = None):
+        self.resizer = resizer
+        self.folder_path = folder_path
+        self.output_dir = output_dir
+        self.width = width
+        self.height = height
+        # Arguments of resize_or_copy_bytes after the data and file name, up to the background
+        self.resize_args = (width, height, maintain_aspect, png_bg_option, custom_color, target_format)
+        self.target_format = target_format
+        self.manifest = manifest
+        self.params = resizer.resize_params(width, height, maintain_aspect, png_bg_option, custom_color, target_format)
+        # Source owning each output path, the first one to claim it
+        self.output_owners = {}
+        # Manifest entries of jobs in flight, recorded once their output is written
+        self.pending_entries = {}
+        # Backgrounds detected once per folder or batch, filled in as sources are read.
+        # Runs with a manifest reuse the ones earlier runs padded with.
+        self.backgrounds = manifest.shared_backgrounds(self.params) if manifest is not None else {}
+        self.scope_sources = functools.partial(resizer.folder_scope_sources, folder_path, recursive)
+    
+    def output_path(self, rel_path: str) -> str:
+        # Same name as the source (without _resized suffix), mirroring any subfolders
+        return os.path.join(self.output_dir, self.resizer.output_name(rel_path, self.target_format))
+    
+    def job(self, index: int, rel_path: str) -> Optional[tuple]:
+        """Return the (key, source) job for rel_path, or None if the manifest shows its output is up to date"""
+        input_path = os.path.join(self.folder_path, rel_path)
+        output_path = self.output_path(rel_path)
+        owner = self.output_owners.setdefault(output_path, rel_path)
+        clash = owner if owner != rel_path else None
+        if self.manifest is not None and clash is None:
+            entry = self.manifest.check(rel_path, input_path, output_path, self.params)
+            if entry is None:
+                return None
+            self.pending_entries[rel_path] = entry
+        return (index, rel_path, output_path, os.path.getsize(input_path)), (input_path, rel_path, clash)
+    
+    def release(self, rel_path: str):
+        """Let other sources claim the output of rel_path, which has been removed"""
+        output_path = self.output_path(rel_path)
+        if self.output_owners.get(output_path) == rel_path:
+            del self.output_owners[output_path]
+    
+    def read(self, source: tuple) -> tuple:
+        """Read a job's source into the arguments of resize_or_copy_bytes"""
+        input_path, rel_path, clash = source
+        if clash:
+            raise ValueError(f"output name already used by {clash}")
+        with open(input_path, 'rb') as f:
+            data = f.read()
+        background = self.resizer.shared_background(self.backgrounds, rel_path, self.scope_sources, functools.partial(os.path.join, self.folder_path), self.width, self.height)
+        return (data, os.path.basename(input_path)) + self.resize_args + (background,)
+    
+    def write(self, key: tuple, data: Optional[bytes]) -> Tuple[int, bool]:
+        """Store a job's result, returning the bytes written and whether the source was copied unchanged"""
+        output_path = key[2]
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if data is None:
+            # Pass-through: the source already is the output
+            shutil.copyfile(os.path.join(self.folder_path, key[1]), output_path)
+            return key[3], True
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        return len(data), False
+    
+    def finish(self, key: tuple, error: Optional[str]):
+        """Record a finished job in the manifest, unless it failed"""
+        entry = self.pending_entries.pop(key[1], None)
+        if self.manifest is not None and error is None:
+            self.manifest.record(key[1], entry)
+    
+    def save(self):
+        if self.manifest is not None:
+            self.manifest.record_backgrounds(self.params, self.backgrounds)
+            self.manifest.save()
+
+
+class FolderWatcher:
+    """Keep resized_<folder> up to date while files are dropped into a folder
+    
+    The folder is rescanned every poll_interval seconds. A new or changed image is resized
+    once its size and modification time have held still for settle_time seconds, so files
+    still being copied in are left alone. Outputs are recorded in the same manifest as
+    incremental batch runs, so a restarted watcher skips what it already produced.
+    """
+    
+    def __init__(self, resizer: ImageResizer, folder_path: str, width: int, height: int, maintain_aspect: bool = True, png_bg_option: str = "auto", custom_color: tuple = None, recursive: bool = False, target_format: Optional[str] = None, workers: int = 1, poll_interval: float = 0.5, settle_time: float = 1.0, progress_callback: Optional[Callable[[dict], None]] = None):
+        if not folder_path or not os.path.isdir(folder_path):
+            raise ValueError("Invalid folder path")
+        if poll_interval <= 0 or settle_time < 0:
+            raise ValueError("poll_interval must be positive and settle_time not negative")
+        self.resizer = resizer
+        self.folder_path = os.path.normpath(folder_path)
+        self.width = width
+        self.height = height
+        self.maintain_aspect = maintain_aspect
+        self.png_bg_option = png_bg_option
+        self.custom_color = custom_color
+        self.recursive = recursive
+        self.target_format = resizer.check_target_format(target_format)
+        # Schedules like a batch run: 0 or None means one worker per CPU core, 1 resizes on a
+        # single background thread, and jobs are admitted within the resizer's memory budget
+        self.engine = BatchEngine(resizer, workers)
+        self.workers = self.engine.workers
+        self.max_in_flight = self.engine.max_in_flight
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.output_dir = os.path.join(os.path.dirname(self.folder_path), f"resized_{os.path.basename(self.folder_path)}")
+        self.progress = BatchProgress(progress_callback)
+        # (size, mtime_ns) of each file when it was last picked up, and of files still
+        # settling together with the time they were first seen with that signature
+        self.picked_up = {}
+        self.settling = {}
+        self.folder_jobs = None
+        self.report = None
+        self.processed_count = 0
+        self.copied_count = 0
+        self.errors = []
+    
+    def scan(self) -> dict:
+        """Map the path of every supported image, relative to the folder, to its (size, mtime_ns)"""
+        snapshot = {}
+        for rel_path in self.resizer.iter_source_files(self.folder_path, self.recursive):
+            if not rel_path.lower().endswith(self.resizer.supported_formats):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.folder_path, rel_path))
+            except OSError:
+                # Removed since it was listed
+                continue
+            snapshot[rel_path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+    
+    def settled(self, snapshot: dict, now: float) -> List[str]:
+        """Return the new or changed files in snapshot whose signature has held for settle_time"""
+        ready = []
+        for rel_path, signature in snapshot.items():
+            if self.picked_up.get(rel_path) == signature:
+                continue
+            seen = self.settling.get(rel_path)
+            if seen is None or seen[0] != signature:
+                self.settling[rel_path] = (signature, now)
+            elif now - seen[1] >= self.settle_time:
+                ready.append(rel_path)
+        # Deleted files start over if they come back
+        for state in (self.settling, self.picked_up):
+            for rel_path in [rel_path for rel_path in state if rel_path not in snapshot]:
+                del state[rel_path]
+        return ready
+    
+    def run(self, stop_event: threading.Event) -> dict:
+        """Watch until stop_event is set, then finish the files in flight and return output_dir,
+        processed_count, copied_count, (file, error) errors and report (a RunReport if instrumented)"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest = ResizeManifest(self.output_dir)
+        # The same read, clash and write steps as an incremental batch run, over the watcher's lifetime
+        self.folder_jobs = FolderJobs(self.resizer, self.folder_path, self.output_dir, self.width, self.height, self.maintain_aspect,
+                                      self.png_bg_option, self.custom_color, self.target_format, self.recursive, manifest)
+        self.report = RunReport() if self.resizer.instrument else None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.resizer,))
+        else:
+            # One thread keeps the loop free to notice new files and stop requests
+            executor = ThreadPoolExecutor(max_workers=1)
+        # Settled files waiting for a free worker, the next job while it doesn't fit in the
+        # memory budget, and the jobs running by future
+        backlog = OrderedDict()
+        held = None
+        pending = {}
+        in_flight_memory = 0
+        picked = itertools.count()
+        next_scan = 0.0
+        try:
+            while not stop_event.is_set():
+                now = time.monotonic()
+                if now >= next_scan:
+                    snapshot = self.scan()
+                    for rel_path in self.picked_up:
+                        if rel_path not in snapshot:
+                            self.folder_jobs.release(rel_path)
+                    in_flight = {job[0][1] for job in pending.values()}
+                    if held is not None:
+                        in_flight.add(held[0][1])
+                    for rel_path in self.settled(snapshot, now):
+                        # A file changed while it is resized is picked up again once that finishes
+                        if rel_path not in in_flight:
+                            backlog[rel_path] = snapshot[rel_path]
+                    next_scan = now + self.poll_interval
+                
+                while (held is not None or backlog) and len(pending) < self.max_in_flight:
+                    if held is None:
+                        rel_path, signature = backlog.popitem(last=False)
+                        self.picked_up[rel_path] = signature
+                        held = self._prepare(next(picked), rel_path)
+                        if held is None:
+                            continue
+                    key, args, memory, read_seconds = held
+                    if not self.engine.fits(memory, in_flight_memory, len(pending)):
+                        break
+                    if self.workers > 1:
+                        future = executor.submit(_run_worker_job, 'resize_or_copy_bytes', args)
+                    else:
+                        future = executor.submit(_run_job, self.resizer.resize_or_copy_bytes, args)
+                    pending[future] = (key, memory, read_seconds)
+                    in_flight_memory += memory
+                    held = None
+                
+                if pending:
+                    done, _ = wait(pending, timeout=max(next_scan - time.monotonic(), 0.01), return_when=FIRST_COMPLETED)
+                    if done:
+                        for future in done:
+                            key, memory, read_seconds = pending.pop(future)
+                            in_flight_memory -= memory
+                            self._finish(key, read_seconds, future)
+                        self.folder_jobs.save()
+                else:
+                    stop_event.wait(max(next_scan - time.monotonic(), 0.01))
+            
+            # Stopping: drop jobs that haven't started and let the rest finish
+            for future in list(pending):
+                if future.cancel():
+                    del pending[future]
+            for future in list(pending):
+                key, memory, read_seconds = pending.pop(future)
+                self._finish(key, read_seconds, future)
+            self.folder_jobs.save()
+            if self.report is not None:
+                self.report.finish()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown()
+        
+        return {'output_dir': self.output_dir, 'processed_count': self.processed_count, 'copied_count': self.copied_count, 'errors': self.errors, 'report': self.report}
+    
+    def _prepare(self, index: int, rel_path: str) -> Optional[tuple]:
+        """Read a settled file into (key, args, estimated memory, read seconds), or None if it is skipped or fails"""
+        key = None
+        began = time.perf_counter()
+        try:
+            job = self.folder_jobs.job(index, rel_path)
+            if job is None:
+                self.progress.report('skipped', rel_path)
+                return None
+            key, source = job
+            args = self.folder_jobs.read(source)
+        except Exception as e:
+            # Removed or unreadable since the scan, or its output name is taken
+            if key is not None:
+                self.folder_jobs.finish(key, str(e))
+            self._report(rel_path, 'failed', key[3] if key is not None else 0, error=str(e))
+            return None
+        read_seconds = time.perf_counter() - began
+        memory = self.resizer.estimate_job_memory('resize_or_copy_bytes', args) if self.engine.memory_budget is not None else 0
+        return key, args, memory, read_seconds
+    
+    def _finish(self, key: tuple, read_seconds: float, future):
+        index, rel_path, output_path, bytes_in = key
+        bytes_out, elapsed, stages = 0, None, None
+        try:
+            data, error, elapsed, stages = future.result()
+        except Exception as e:
+            # The worker process itself failed (e.g. it was killed)
+            data, error = None, str(e)
+        if error is None:
+            began = time.perf_counter()
+            try:
+                bytes_out, was_copied = self.folder_jobs.write(key, data)
+            except OSError as e:
+                error = str(e)
+            if stages is not None:
+                stages.update(read=read_seconds, write=time.perf_counter() - began)
+        self.folder_jobs.finish(key, error)
+        if error is None:
+            if was_copied:
+                status = 'copied'
+                self.copied_count += 1
+            else:
+                status = 'done'
+                self.processed_count += 1
+        else:
+            status = 'failed'
+        self._report(rel_path, status, bytes_in, bytes_out, elapsed, stages, error)
+    
+    def _report(self, rel_path: str, status: str, bytes_in: int = 0, bytes_out: int = 0, elapsed: Optional[float] = None, stages: Optional[dict] = None, error: Optional[str] = None):
+        if error is not None:
+            self.errors.append((rel_path, error))
+        self.progress.report(status, rel_path, bytes_in, bytes_out, elapsed, error)
+        if self.report is not None:
+            self.report.add(rel_path, status, bytes_in, bytes_out, elapsed, stages, error)
@@ -0,0 +1,263 @@
+"""Headless command-line interface for ImageResizer
+
+Runs without tkinter, so it can be used from cron or on machines without a display.
+
+Examples:
+    python resize_cli.py file photo.jpg --width 800 --height 600 -o photo_800.jpg
+    python resize_cli.py folder ./catalogue --recursive --workers 0 --json
+    python resize_cli.py zip products.zip --png-bg white -o products_resized.zip
+    python resize_cli.py watch ./incoming --workers 0 --progress
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import threading
+import time
+
+from image_resizer import FolderWatcher, ImageResizer, peak_rss
+
+
+def parse_color(value: str) -> tuple:
+    """Parse a #RRGGBB color into an RGB tuple"""
+    hex_color = value.lstrip('#')
+    if len(hex_color) != 6:
+        raise argparse.ArgumentTypeError(f"expected a #RRGGBB color, got {value!r}")
+    try:
+        return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a #RRGGBB color, got {value!r}")
+
+
+def parse_rendition(value: str) -> dict:
+    """Parse a NAME:WIDTHxHEIGHT rendition"""
+    try:
+        name, size = value.split(':')
+        width, height = size.lower().split('x')
+        return {'name': name, 'width': int(width), 'height': int(height)}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected NAME:WIDTHxHEIGHT, got {value!r}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Resize images onto a padded canvas without the desktop UI")
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+
+    # Options shared by every mode, mirroring the desktop app controls
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--width', type=int, default=800, help="canvas width (default: 800)")
+    common.add_argument('--height', type=int, default=600, help="canvas height (default: 600)")
+    common.add_argument('--no-maintain-aspect', dest='maintain_aspect', action='store_false',
+                        help="don't scale large images down to fit the canvas")
+    common.add_argument('--png-bg', dest='png_bg_option', choices=('auto', 'black', 'white', 'custom'), default='auto',
+                        help="background for PNG files (default: auto)")
+    common.add_argument('--custom-color', type=parse_color, help="#RRGGBB background used with --png-bg custom")
+    common.add_argument('--background-estimator', choices=ImageResizer.background_estimators, default='mean',
+                        help="how corner pixels are reduced to a background color (default: mean)")
+    common.add_argument('--fast-decode', dest='reducing_gap', type=float, metavar='GAP',
+                        help="decode JPEGs at reduced resolution, at least GAP x the output size")
+    common.add_argument('--encoder-profile', choices=tuple(ImageResizer.encoder_profiles),
+                        help="per-format save settings trading encode time for file size (default: quality 95)")
+    common.add_argument('--memory-budget', dest='memory_budget_mb', type=float, metavar='MB',
+                        help="limit the estimated decoded image memory in flight; oversized JPEGs are decoded at reduced scale")
+    common.add_argument('--no-pass-through', dest='pass_through', action='store_false',
+                        help="re-encode images that already fill the canvas instead of copying them unchanged")
+    common.add_argument('--json', action='store_true', help="print a machine-readable JSON summary")
+
+    batch = argparse.ArgumentParser(add_help=False)
+    batch.add_argument('--workers', type=int, default=1, help="worker processes, 0 for one per CPU core (default: 1)")
+    batch.add_argument('--progress', action='store_true', help="stream one JSON progress event per file to stderr")
+    batch.add_argument('--format', dest='target_format', choices=tuple(ImageResizer.target_formats),
+                       help="convert outputs to this format, renaming them to match (default: keep each source format)")
+    batch.add_argument('--largest-first', action='store_true',
+                       help="read image headers first and start the most expensive images first")
+    batch.add_argument('--report', metavar='PATH',
+                       help="time every file stage by stage and write a report to PATH (CSV if it ends in .csv, else JSON)")
+    batch.add_argument('--slowest', type=int, default=10, metavar='N', help="slowest files listed in a JSON report (default: 10)")
+    batch.add_argument('--profile', dest='profile_dir', metavar='DIR', help="write a cProfile dump per process into DIR")
+    batch.add_argument('--background-scope', choices=ImageResizer.background_scopes, default='image',
+                       help="detect the background once per image, per subfolder or per batch and reuse it (default: image)")
+    batch.add_argument('--plan', action='store_true',
+                       help="print a JSON plan built from image headers (counts, pixels, estimated cost) and exit")
+
+    file_parser = subparsers.add_parser('file', parents=[common], help="resize a single image")
+    file_parser.add_argument('input')
+    file_parser.add_argument('-o', '--output', help="output path (default: resized_<name> next to the input)")
+
+    folder_parser = subparsers.add_parser('folder', parents=[common, batch], help="resize every image in a folder into resized_<folder>")
+    folder_parser.add_argument('input')
+    folder_parser.add_argument('--recursive', action='store_true', help="include subfolders, mirroring the tree in the output")
+    folder_parser.add_argument('--incremental', action='store_true',
+                               help="skip images whose output is still valid according to the manifest in the output folder")
+    folder_parser.add_argument('--rendition', dest='renditions', type=parse_rendition, action='append', metavar='NAME:WxH',
+                               help="write a rendition into resized_<folder>/NAME, decoding each source once; "
+                                    "repeat for several sizes (replaces --width/--height). Renditions are always "
+                                    "re-encoded and can't be combined with --incremental or --background-scope")
+
+    zip_parser = subparsers.add_parser('zip', parents=[common, batch], help="resize every image in a zip into a new zip")
+    zip_parser.add_argument('input')
+    zip_parser.add_argument('-o', '--output', help="output zip (default: resized_<name>.zip next to the input)")
+    zip_parser.add_argument('--zip-level', dest='zip_compresslevel', type=int, choices=range(10), metavar='0-9',
+                            help="deflate level for members that aren't already compressed (JPEG, PNG and WebP are stored as is)")
+
+    watch_parser = subparsers.add_parser('watch', parents=[common],
+                                         help="keep resized_<folder> up to date as images are added or changed, until Ctrl+C")
+    watch_parser.add_argument('input')
+    watch_parser.add_argument('--recursive', action='store_true', help="include subfolders, mirroring the tree in the output")
+    watch_parser.add_argument('--workers', type=int, default=1, help="worker processes, 0 for one per CPU core (default: 1)")
+    watch_parser.add_argument('--progress', action='store_true', help="stream one JSON progress event per file to stderr")
+    watch_parser.add_argument('--format', dest='target_format', choices=tuple(ImageResizer.target_formats),
+                              help="convert outputs to this format, renaming them to match (default: keep each source format)")
+    watch_parser.add_argument('--background-scope', choices=ImageResizer.background_scopes, default='image',
+                              help="detect the background once per image, per subfolder or per batch and reuse it (default: image)")
+    watch_parser.add_argument('--poll-interval', type=float, default=0.5, metavar='SECONDS',
+                              help="how often the folder is rescanned (default: 0.5)")
+    watch_parser.add_argument('--settle-time', type=float, default=1.0, metavar='SECONDS',
+                              help="how long a file's size and modification time must hold still before it is resized (default: 1.0)")
+    watch_parser.add_argument('--report', metavar='PATH',
+                              help="time every file stage by stage and write a report to PATH when stopped (CSV if it ends in .csv, else JSON)")
+    watch_parser.add_argument('--slowest', type=int, default=10, metavar='N', help="slowest files listed in a JSON report (default: 10)")
+
+    return parser
+
+
+def default_output(input_path: str) -> str:
+    return os.path.join(os.path.dirname(input_path), f"resized_{os.path.basename(input_path)}")
+
+
+def print_progress(event: dict):
+    print(json.dumps(event), file=sys.stderr, flush=True)
+
+
+def plan(args: argparse.Namespace) -> dict:
+    """Plan the selected batch mode from image headers without resizing anything"""
+    resizer = ImageResizer(args.background_estimator, args.reducing_gap, args.encoder_profile, args.memory_budget_mb, args.pass_through)
+    if args.mode == 'folder':
+        result = resizer.plan_folder(args.input, args.width, args.height, args.maintain_aspect, args.recursive, args.target_format)
+    else:
+        result = resizer.plan_zip(args.input, args.width, args.height, args.maintain_aspect, args.target_format)
+    result['errors'] = [{'file': name, 'error': error} for name, error in result['errors']]
+    return result
+
+
+def run(args: argparse.Namespace, cancel_event: threading.Event) -> dict:
+    """Run the selected mode and return a JSON-serialisable summary"""
+    resizer = ImageResizer(args.background_estimator, args.reducing_gap, args.encoder_profile, args.memory_budget_mb, args.pass_through,
+                           instrument=bool(getattr(args, 'report', None)), profile_dir=getattr(args, 'profile_dir', None),
+                           zip_compresslevel=getattr(args, 'zip_compresslevel', None), background_scope=getattr(args, 'background_scope', 'image'))
+    options = (args.width, args.height, args.maintain_aspect, args.png_bg_option, args.custom_color)
+    summary = {'mode': args.mode, 'input': args.input, 'cancelled': False}
+    batch_options = {}
+    if args.mode not in ('file', 'watch'):
+        batch_options = {'workers': args.workers, 'cancel_event': cancel_event, 'largest_first': args.largest_first,
+                         'progress_callback': print_progress if args.progress else None}
+
+    if args.mode == 'file':
+        output_path = args.output or default_output(args.input)
+        try:
+            resizer.resize_file(args.input, output_path, *options)
+            summary.update(output=output_path, processed=1, errors=[])
+        except Exception as e:
+            summary.update(output=None, processed=0, errors=[{'file': args.input, 'error': str(e)}])
+
+    elif args.mode == 'folder' and args.renditions:
+        renditions = [dict(rendition, maintain_aspect=args.maintain_aspect, png_bg_option=args.png_bg_option,
+                           custom_color=args.custom_color) for rendition in args.renditions]
+        result = resizer.batch_renditions(args.input, renditions, recursive=args.recursive, target_format=args.target_format,
+                                          **batch_options)
+        summary.update(output=result['output_dir'], processed=len(result['processed_files']) // len(renditions),
+                       outputs=len(result['processed_files']), cancelled=result['cancelled'],
+                       errors=[{'file': name, 'error': error} for name, error in result['errors']])
+
+    elif args.mode == 'folder':
+        result = resizer.batch_folder(args.input, *options, recursive=args.recursive, incremental=args.incremental,
+                                      target_format=args.target_format, **batch_options)
+        summary.update(output=result['output_dir'], processed=len(result['processed_files']),
+                       skipped=len(result['skipped_files']), copied=len(result['copied_files']), cancelled=result['cancelled'], stages=result['stages'],
+                       errors=[{'file': name, 'error': error} for name, error in result['errors']])
+
+    elif args.mode == 'watch':
+        watcher = FolderWatcher(resizer, args.input, *options, recursive=args.recursive, target_format=args.target_format,
+                                workers=args.workers, poll_interval=args.poll_interval, settle_time=args.settle_time,
+                                progress_callback=print_progress if args.progress else None)
+        result = watcher.run(cancel_event)
+        summary.update(output=result['output_dir'], processed=result['processed_count'], copied=result['copied_count'],
+                       errors=[{'file': name, 'error': error} for name, error in result['errors']])
+
+    else:
+        result = resizer.batch_zip(args.input, *options, target_format=args.target_format, **batch_options)
+        output_path = args.output or default_output(args.input)
+        if result['cancelled']:
+            # A partial archive is not a useful result
+            os.remove(result['output_zip'])
+            output_path = None
+        else:
+            shutil.move(result['output_zip'], output_path)
+        summary.update(output=output_path, processed=result['processed_count'], copied=result['copied_count'], cancelled=result['cancelled'],
+                       stages=result['stages'],
+                       errors=[{'file': name, 'error': error} for name, error in result['errors']])
+
+    if args.mode != 'file' and result['report'] is not None:
+        result['report'].write(args.report, args.slowest)
+        summary['report'] = args.report
+    summary['failed'] = len(summary['errors'])
+    summary['peak_rss'] = peak_rss()
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.png_bg_option == 'custom' and not args.custom_color:
+        parser.error("--png-bg custom requires --custom-color")
+    if getattr(args, 'renditions', None):
+        # batch_renditions has no manifest and detects backgrounds per image
+        if args.incremental:
+            parser.error("--rendition can't be combined with --incremental")
+        if args.background_scope != 'image':
+            parser.error("--rendition can't be combined with --background-scope")
+
+    if getattr(args, 'plan', False):
+        print(json.dumps(plan(args), indent=2))
+        return 0
+    
+    # Ctrl+C stops feeding new files and still reports what finished
+    cancel_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: cancel_event.set())
+
+    start = time.perf_counter()
+    try:
+        summary = run(args, cancel_event)
+    except Exception as e:
+        summary = {'mode': args.mode, 'input': args.input, 'cancelled': False, 'output': None, 'processed': 0,
+                   'failed': 1, 'errors': [{'file': args.input, 'error': str(e)}]}
+    summary['elapsed_seconds'] = round(time.perf_counter() - start, 3)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"Processed {summary['processed']} images successfully")
+        if summary['cancelled']:
+            print("Cancelled before all images were processed")
+        if summary.get('skipped'):
+            print(f"Skipped {summary['skipped']} unchanged images")
+        if summary.get('copied'):
+            print(f"Copied {summary['copied']} images already at the target size unchanged")
+        if summary['output']:
+            print(f"Output: {summary['output']}")
+        if summary.get('report'):
+            print(f"Report: {summary['report']}")
+        if summary.get('peak_rss'):
+            print(f"Peak memory: {summary['peak_rss']['parent_mb']:.0f} MB (largest worker {summary['peak_rss']['workers_mb']:.0f} MB)")
+        for error in summary['errors']:
+            print(f"Error: {error['file']}: {error['error']}", file=sys.stderr)
+
+    return 1 if summary['failed'] or summary['cancelled'] else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())